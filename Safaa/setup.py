@@ -43,6 +43,11 @@ setup(
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: GNU Lesser General Public License v2 (LGPLv2)",
     ],
+    entry_points={
+        "console_scripts": [
+            "safaa=safaa.cli:main",
+        ],
+    },
     include_package_data=True,
     include_dirs=[],
     package_data={
@@ -52,5 +57,5 @@ setup(
             "src/safaa/configs/*",
         ]
     },
-    python_requires=">=3.6",
+    python_requires=">=3.9",
 )
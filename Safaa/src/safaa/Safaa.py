@@ -6,29 +6,262 @@
 SafaaAgent: A module for handling false positive detection in copyright notices.
 """
 
+import copy
+import csv
+import json
 import os
-import re
-import spacy
-from joblib import load, dump
-import pkg_resources
+import random
 import shutil
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+from importlib import resources
+from itertools import islice
+
+from .cache import ResultCache, fingerprint, path_fingerprint
+from .locking import MemoryZones, ReadWriteLock
+from .normalizer import TextNormalizer
 
 # Constants
-DEFAULT_MODEL_DIR = pkg_resources.resource_filename(__name__, "models")
+DEFAULT_MODEL_DIR = str(resources.files(__package__) / "models")
 LOCAL_MODEL_DIR = "/home/fossy/Safaa"
-CONFIGS_DIR = pkg_resources.resource_filename(__name__, "configs")
+CONFIGS_DIR = str(resources.files(__package__) / "configs")
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_SHUFFLE_BUFFER = 10000
+DEFAULT_WATCH_INTERVAL = 5.0
+TRAINING_PROGRESS_FILE = "training_progress.json"
+SPACY_MODELS = ("entity_recognizer", "declutter_model")
+COMPACT_MODELS = ("false_positive_detector", "vectorizer")
+COMPACT_MODEL_DIR = "compact"
+MODEL_NAMES = ("false_positive_detector", "vectorizer", *SPACY_MODELS)
+
+# The vocab tables, and the components other than those setting entities and
+# their embedding layers, are not loaded for inference only
+INFERENCE_EXCLUDED_TABLES = ("strings", "lookups")
+ENTITY_ATTRIBUTES = ("doc.ents", "token.ent_iob", "token.ent_type")
+EMBEDDING_FACTORIES = ("tok2vec", "transformer")
+
+# The attributes describing the loaded models, swapped together when the
+# agent adopts a new model version
+MODEL_STATE = (
+    "model_dir",
+    "false_positive_detector_path",
+    "vectorizer_path",
+    "entity_recognizer_path",
+    "declutter_model_path",
+    "compact_model_path",
+    "compact",
+    "_models",
+    "_vocab",
+    "_scorer",
+    "_shared_tokenizer",
+    "_detector_trained",
+)
+
+# The context used for stages when profiling is disabled
+_NO_PROFILING = nullcontext()
+
+
+def _shuffled(items, buffer_size, rng):
+    """
+    Shuffles a stream through a buffer of buffer_size items, so that memory
+    stays bounded however long the stream is. A buffer of 0 items keeps the
+    stream in order.
+    """
+
+    if buffer_size == 0:
+        yield from items
+        return
+    buffer = []
+    for item in items:
+        if len(buffer) < buffer_size:
+            buffer.append(item)
+            continue
+        # Emit a random buffered item and keep the new one in its place
+        index = rng.randrange(buffer_size)
+        yield buffer[index]
+        buffer[index] = item
+    rng.shuffle(buffer)
+    yield from buffer
+
+
+def _windows(text, max_chars):
+    """
+    Splits a string into consecutive windows of at most max_chars characters,
+    ending each window after its last whitespace where there is one, so that
+    the windows concatenate back to the string.
+    """
+
+    windows = []
+    while len(text) > max_chars:
+        window = text[:max_chars]
+        end = max(window.rfind(" "), window.rfind("\n"), window.rfind("\t"))
+        end = end + 1 if end > 0 else max_chars
+        windows.append(text[:end])
+        text = text[end:]
+    windows.append(text)
+    return windows
+
+
+def _dump_atomic(model, path):
+    """
+    Dumps a model with joblib to a temporary file next to the path, then
+    renames it over the path.
+    """
+
+    from joblib import dump
+
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        dump(model, temporary_path)
+        os.replace(temporary_path, path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
+def _peak_rss():
+    """
+    Returns the peak resident memory of the process since it started in
+    bytes, or None where the resource module is unavailable.
+    """
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes and macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class _LazyModel:
+    """
+    Descriptor holding a model of the agent, loaded on first access.
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, agent, owner=None):
+        if agent is None:
+            return self
+        model = agent._models.get(self.name)
+        if model is None:
+            # Load the model only once when threads ask for it together
+            with agent._load_lock:
+                model = agent._models.get(self.name)
+                if model is None:
+                    model = agent._load_model(self.name)
+        return model
+
+    def __set__(self, agent, model):
+        with agent._lock.write():
+            agent._models[self.name] = model
+            # The scorer is built from the replaced models
+            agent._scorer = None
 
 
 class SafaaAgent:
-    def __init__(self, use_local_model=True, model_dir=None):
+    # The models, each loaded from its file path on first use
+    false_positive_detector = _LazyModel()
+    vectorizer = _LazyModel()
+    entity_recognizer = _LazyModel()
+    declutter_model = _LazyModel()
+
+    def __init__(
+        self,
+        use_local_model=True,
+        model_dir=None,
+        batch_size=DEFAULT_BATCH_SIZE,
+        n_process=1,
+        cache=None,
+        deduplicate=True,
+        profiler=None,
+        compact=None,
+        inference_only=False,
+        share_vocab=False,
+        prefilter=None,
+        sort_by_length=True,
+        max_chars=None,
+        overflow="window",
+    ):
         """
-        Initializes the SafaaAgent with the necessary models.
+        Initializes the SafaaAgent with the paths of the necessary models.
+
+        The models are only loaded when first used.
 
         Parameters:
         use_local_model (bool): Flag to use local models if available.
         model_dir (str): Custom directory path for models. Defaults to None.
+        batch_size (int): Number of texts buffered per spaCy batch.
+                          Defaults to DEFAULT_BATCH_SIZE.
+        n_process (int): Number of processes spaCy uses for inference.
+                         Defaults to 1.
+        cache (ResultCache): Cache for predict and declutter results.
+                             Defaults to None, disabling caching.
+        deduplicate (bool): Flag to process identical inputs only once per
+                            call. Defaults to True.
+        profiler (Profiler): Records the time, items and memory of each
+                             stage. Defaults to None, disabling profiling.
+        compact (bool): Flag to load the vectorizer and the false positive
+                        detector from the memory-mapped compact artifacts of
+                        the model directory instead of the pickles. Defaults
+                        to None, using the compact artifacts when present.
+        inference_only (bool): Flag to load the spaCy pipelines without their
+                               vocab string and lookup tables and without
+                               the components not needed to predict
+                               entities. Defaults to False.
+        share_vocab (bool): Flag to load both spaCy pipelines into a single
+                            vocab when they are of the same language and
+                            have no static vectors. Defaults to False.
+        prefilter (Prefilter): Labels the obvious strings before the models
+                               run, for predict and process. Defaults to
+                               None, running the models over every string.
+        sort_by_length (bool): Flag to run the spaCy models over the strings
+                               of a call from shortest to longest, so that
+                               each batch holds strings of similar lengths.
+                               Defaults to True.
+        max_chars (int): Character budget of a string for the spaCy models.
+                         Defaults to None, running them over whole strings.
+        overflow (str): How strings over max_chars are handled: "window"
+                        runs the models over windows of at most max_chars
+                        characters and joins their results, "truncate" only
+                        keeps the first window. Defaults to "window".
         """
 
+        # Store the default batching options for the spaCy pipelines
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.sort_by_length = sort_by_length
+        self.max_chars = max_chars
+        if overflow not in ("window", "truncate"):
+            raise ValueError(f"Unknown overflow handling: {overflow!r}")
+        self.overflow = overflow
+
+        # Compile the text substitution patterns once
+        self.normalizer = TextNormalizer()
+
+        # Store the result cache and the fingerprints of the loaded models
+        self.cache = cache
+        self._fingerprints = None
+        self._detector_trained = False
+
+        # Store the deduplication flag and the statistics of the last calls
+        self.deduplicate = deduplicate
+        self.dedup_stats = {}
+
+        # Store the profiler of the stages and the prefilter
+        self.profiler = profiler
+        self.prefilter = prefilter
+
+        # Store the spaCy loading options
+        self.inference_only = inference_only
+        self.share_vocab = share_vocab
+
         # Determine the model directory based on the provided arguments
         model_dir = (
             model_dir
@@ -40,7 +273,42 @@ class SafaaAgent:
             )
         )
 
+        # Guard the models against training and swaps during inference calls
+        self._init_locks()
+
         # Construct the file paths for each model
+        self._compact_option = compact
+        self._set_model_dir(model_dir)
+
+        # No model version is watched nor staged yet
+        self.model_version = None
+        self._staged = None
+        self._watcher = None
+
+        # Load the models from the constructed file paths on first use
+        self._load_models()
+
+    def _init_locks(self):
+        """
+        Creates the locks letting threads share the agent: inference calls
+        hold the read side of the model lock and training and model swaps the
+        write side, lazy loading holds the load lock, and the concurrent
+        calls of each spaCy pipeline share its memory zone.
+        """
+
+        self._lock = ReadWriteLock()
+        self._load_lock = threading.RLock()
+        self._zones = MemoryZones()
+
+    def _set_model_dir(self, model_dir):
+        """
+        Sets the model directory and the file paths of each model.
+
+        Parameters:
+        model_dir (str): The model directory.
+        """
+
+        self.model_dir = model_dir
         self.false_positive_detector_path = os.path.join(
             model_dir, "false_positive_detection_model_sgd.pkl"
         )
@@ -51,34 +319,373 @@ class SafaaAgent:
             model_dir, "entity_recognizer"
         )
         self.declutter_model_path = os.path.join(model_dir, "declutter_model")
+        self.compact_model_path = os.path.join(model_dir, COMPACT_MODEL_DIR)
+
+        # Use the compact artifacts when requested or when they are present
+        self.compact = (
+            self._compact_option
+            if self._compact_option is not None
+            else os.path.exists(
+                os.path.join(self.compact_model_path, "manifest.json")
+            )
+        )
 
-        # Load the models from the constructed file paths
-        self._load_models()
-
-    def _load_models(self):
+    def _load_models(self, eager=False):
         """
         Loads models from file paths.
+
+        Parameters:
+        eager (bool): Flag to load all models now instead of on first use.
+                      Defaults to False.
+        """
+
+        with self._lock.write():
+            # Forget the loaded models so they are loaded again from file
+            # paths
+            self._models = {}
+            self._vocab = None
+            self._scorer = None
+            self._shared_tokenizer = None
+            self._detector_trained = False
+
+            # Drop the cached results of previously loaded models
+            self._update_fingerprints()
+
+            if eager:
+                for name in MODEL_NAMES:
+                    getattr(self, name)
+
+    def _load_model(self, name):
         """
+        Loads a single model from its file path.
 
-        # Load the False Positive Detector model
-        self.false_positive_detector = load(self.false_positive_detector_path)
+        The scikit-learn models are loaded using joblib, or memory-mapped from
+        the compact artifacts if enabled, and the others using spaCy,
+        importing each library only when it is first needed.
 
-        # Load the Vectorizer model
-        self.vectorizer = load(self.vectorizer_path)
+        Parameters:
+        name (str): The name of the model attribute.
 
-        # Load the Entity Recognizer model using spaCy
-        self.entity_recognizer = spacy.load(self.entity_recognizer_path)
+        Returns:
+        object: The loaded model.
+        """
 
-        # Load the Declutter model using spaCy
-        self.declutter_model = spacy.load(self.declutter_model_path)
+        path = getattr(self, f"{name}_path")
+        if name in SPACY_MODELS:
+            model = self._load_spacy_model(path)
+        elif self.compact and name in COMPACT_MODELS:
+            from .artifacts import (
+                load_compact_classifier,
+                load_compact_vectorizer,
+            )
 
-    def preprocess_data(self, data):
+            model = (
+                load_compact_vectorizer(self.compact_model_path)
+                if name == "vectorizer"
+                else load_compact_classifier(self.compact_model_path)
+            )
+        else:
+            from joblib import load
+
+            model = load(path)
+        self._models[name] = model
+        return model
+
+    def _load_spacy_model(self, path):
+        """
+        Loads a spaCy pipeline, for inference only and into the shared vocab
+        if enabled.
+
+        Parameters:
+        path (str): The pipeline directory.
+
+        Returns:
+        Language: The loaded pipeline.
+        """
+
+        import spacy
+
+        if not self.inference_only and not self.share_vocab:
+            return spacy.load(path)
+
+        from spacy.language import Language
+        from spacy.util import load_config, registry
+
+        config = load_config(
+            os.path.join(path, "config.cfg"), interpolate=True
+        )
+        options = {}
+
+        # Skip the string and lookup tables of the vocab, which the pipeline
+        # adds the strings it needs to as it runs, and the components not
+        # setting entities
+        if self.inference_only:
+            # spaCy registers its built-in factories on first use since 3.8
+            if hasattr(registry, "ensure_populated"):
+                registry.ensure_populated()
+            exclude = list(INFERENCE_EXCLUDED_TABLES)
+            for name in config["nlp"]["pipeline"]:
+                factory = config["components"][name].get("factory")
+                if factory is None or factory in EMBEDDING_FACTORIES:
+                    continue
+                try:
+                    assigns = Language.get_factory_meta(factory).assigns
+                except ValueError:
+                    # Keep the components of unknown factories
+                    continue
+                if not set(assigns) & set(ENTITY_ATTRIBUTES):
+                    exclude.append(name)
+            options["exclude"] = exclude
+
+        # Pipelines of the same language share a vocab, unless loading one
+        # would replace the static vectors of the other
+        lang = config["nlp"]["lang"]
+        vectors = config["initialize"].get("vectors")
+        shared = (
+            self.share_vocab
+            and vectors is None
+            and (self._vocab is None or self._vocab.lang == lang)
+        )
+        if shared and self._vocab is not None:
+            # Keep the strings of the pipeline out of the memory zones of
+            # concurrent calls
+            options["vocab"] = self._vocab
+            with self._zones.exclusive(self._vocab):
+                return spacy.load(path, **options)
+
+        model = spacy.load(path, **options)
+        if shared:
+            self._vocab = model.vocab
+        return model
+
+    def _update_fingerprints(self):
+        """
+        Recomputes the fingerprints of the loaded models and invalidates the
+        cached results produced by other models.
+
+        The fingerprints are computed from the model files, without loading
+        the models. The predict fingerprint covers the entity recognizer, the
+        vectorizer and the false positive detector, or their compact
+        artifacts, and the current detector weights once it has been trained.
+        The declutter fingerprint only covers the declutter model.
+        """
+
+        detector = self._models.get("false_positive_detector")
+        if self._detector_trained and hasattr(detector, "coef_"):
+            classifier_fingerprint = fingerprint(
+                path_fingerprint(self.vectorizer_path),
+                detector.coef_.tobytes(),
+                detector.intercept_.tobytes(),
+            )
+        elif self.compact:
+            classifier_fingerprint = path_fingerprint(self.compact_model_path)
+        else:
+            classifier_fingerprint = fingerprint(
+                path_fingerprint(self.vectorizer_path),
+                path_fingerprint(self.false_positive_detector_path),
+            )
+        self._fingerprints = {
+            "predict": fingerprint(
+                path_fingerprint(self.entity_recognizer_path),
+                classifier_fingerprint,
+            ),
+            "declutter": path_fingerprint(self.declutter_model_path),
+        }
+
+        if self.cache is not None:
+            self.cache.invalidate(self._fingerprints.values())
+
+    def _deduplicate(self, data):
+        """
+        Collapses identical strings, if deduplication is enabled.
+
+        Parameters:
+        data (list): A list of strings.
+
+        Returns:
+        tuple: The distinct strings in order of first appearance, and for
+               each input string the index of its distinct string.
+        """
+
+        if not self.deduplicate:
+            return data, range(len(data))
+        positions = {}
+        inverse = [positions.setdefault(text, len(positions)) for text in data]
+        return list(positions), inverse
+
+    def _dedup_ratio(self, data, unique):
+        """
+        Summarizes the deduplication of a call.
+
+        Parameters:
+        data (list): The input strings.
+        unique (list): The distinct input strings.
+
+        Returns:
+        dict: The number of inputs, of distinct inputs and their ratio.
+        """
+
+        return {
+            "inputs": len(data),
+            "unique_inputs": len(unique),
+            "ratio": len(data) / len(unique) if unique else 1.0,
+        }
+
+    def _cached(self, namespace, model, texts, compute):
+        """
+        Computes results through the result cache, if one is configured.
+
+        Parameters:
+        namespace (str): The kind of result, including its options.
+        model (str): The fingerprint to key the results by, either
+                     "predict" or "declutter".
+        texts (list): The input strings.
+        compute (callable): Computes the results of a list of strings.
+
+        Returns:
+        list: The results, in input order.
+        """
+
+        if self.cache is None:
+            return compute(texts)
+
+        # Look up the results of the texts seen before
+        model_fingerprint = self._fingerprints[model]
+        keys = [
+            ResultCache.make_key(model_fingerprint, namespace, text)
+            for text in texts
+        ]
+        results = self.cache.get_many(keys)
+
+        # Compute and store the results of the other texts
+        missing = [i for i, key in enumerate(keys) if key not in results]
+        if missing:
+            computed = dict(
+                zip(
+                    (keys[i] for i in missing),
+                    compute([texts[i] for i in missing]),
+                )
+            )
+            self.cache.set_many(computed, model_fingerprint)
+            results.update(computed)
+
+        return [results[key] for key in keys]
+
+    def _pipe(
+        self, model, texts, extract, join, batch_size=None, n_process=None
+    ):
+        """
+        Runs a spaCy model over the texts in batches using nlp.pipe, and
+        extracts a result from each processed doc.
+
+        Texts longer than the character budget are processed in windows,
+        whose results are joined, or truncated to their first window. The
+        texts are processed from shortest to longest if length bucketing is
+        enabled.
+
+        Parameters:
+        model (Language): The spaCy pipeline to run.
+        texts (list): The strings to process.
+        extract (callable): Computes the result of a processed doc.
+        join (callable): Joins the results of the windows of a string.
+        batch_size (int): Overrides the agent batch size. Defaults to None.
+        n_process (int): Overrides the agent process count. Defaults to None.
+
+        Returns:
+        list: The results, in input order.
+        """
+
+        # Split the strings over the character budget into windows
+        count, owners = len(texts), None
+        if self.max_chars:
+            pieces, owners = [], []
+            for i, text in enumerate(texts):
+                windows = _windows(text, self.max_chars)
+                if self.overflow == "truncate":
+                    windows = windows[:1]
+                for window in windows:
+                    pieces.append(window)
+                    owners.append(i)
+            texts = pieces
+
+        # Process the strings in length order and put the results back in
+        # input order
+        order = self._length_order(texts)
+        results = [None] * len(texts)
+        docs = model.pipe(
+            (texts[i] for i in order),
+            batch_size=batch_size or self.batch_size,
+            n_process=n_process or self.n_process,
+        )
+        for i, doc in zip(order, docs):
+            results[i] = extract(doc)
+        if owners is None:
+            return results
+
+        # Join the results of the windows of each string
+        windows = [[] for _ in range(count)]
+        for owner, result in zip(owners, results):
+            windows[owner].append(result)
+        return [join(window_results) for window_results in windows]
+
+    def _length_order(self, items):
+        """
+        Returns the indices of the items from shortest to longest if length
+        bucketing is enabled, or in input order otherwise.
+        """
+
+        if not self.sort_by_length:
+            return range(len(items))
+        return sorted(range(len(items)), key=lambda i: len(items[i]))
+
+    def _stage(self, name, items=0):
+        """
+        Returns a context measuring a stage with the agent profiler, or a
+        no-op context when profiling is disabled.
+
+        Parameters:
+        name (str): The name of the stage.
+        items (int): The number of items the stage processes. Defaults to 0.
+
+        Returns:
+        contextmanager: The stage context.
+        """
+
+        if self.profiler is None:
+            return _NO_PROFILING
+        return self.profiler.stage(name, items)
+
+    def _memory_zone(self, model):
+        """
+        Returns a context in which the strings and other resources a spaCy
+        model allocates for the processed docs are freed on exit, so that
+        memory does not grow with the number of distinct tokens seen.
+
+        Concurrent calls share the zone of a pipeline, which is freed when
+        the last one exits. The docs processed in the context must not be
+        used after it exits.
+
+        Parameters:
+        model (Language): The spaCy pipeline.
+
+        Returns:
+        contextmanager: The memory zone, or a no-op context for spaCy
+                        versions without memory zones.
+        """
+
+        if hasattr(model, "memory_zone"):
+            return self._zones.zone(model)
+        return nullcontext()
+
+    def preprocess_data(self, data, batch_size=None, n_process=None):
         """
         Preprocesses the given data by performing various text cleaning and
         transformation tasks.
 
         Parameters:
         data (iterable): The data to preprocess.
+        batch_size (int): Overrides the agent batch size. Defaults to None.
+        n_process (int): Overrides the agent process count. Defaults to None.
 
         Returns:
         data (list): List of preprocessed strings.
@@ -87,11 +694,13 @@ class SafaaAgent:
         # Ensure the data is a list of strings
         data = self._ensure_list_of_strings(data)
 
-        # Replace copyright holder entities in the data
-        data = self._replace_entities(data)
+        with self._lock.read():
+            # Replace copyright holder entities in the data
+            data = self._replace_entities(data, batch_size, n_process)
 
-        # Perform text substitutions for dates, numbers, symbols, emails, etc.
-        data = self._perform_text_substitutions(data)
+            # Perform text substitutions for dates, numbers, symbols, emails,
+            # etc.
+            data = self._perform_text_substitutions(data)
 
         return data
 
@@ -99,8 +708,9 @@ class SafaaAgent:
         """
         Ensures the data is a list of strings.
 
-        If the input data is not a list, attempts to convert it to a list.
-        Then, ensures each element of the list is a string.
+        If the input data is not a list, attempts to convert it to a list,
+        using its to_list method if it has one (e.g. a pandas Series). Then,
+        ensures each element of the list is a string.
 
         Parameters:
         data (iterable): The data to be converted to a list of strings.
@@ -110,45 +720,73 @@ class SafaaAgent:
         """
 
         # If data is not a list, try converting it to a list
-        if not isinstance(data, list):
+        if not isinstance(data, list) and hasattr(data, "to_list"):
             data = data.to_list()
         # Ensure each item in the list is a string
         return [str(item) for item in data]
 
-    def _replace_entities(self, data):
+    def _replace_entities(self, data, batch_size=None, n_process=None):
         """
         Replaces detected copyright holder entities with ' ENTITY '.
 
         Uses the entity_recognizer model to identify copyright holder entities,
-        which are often name or organization entities, and replaces them with
-        the string ' ENTITY '.
+        which are often name or organization entities, and replaces their
+        spans with the string ' ENTITY '.
 
         Parameters:
         data (list): A list of strings.
+        batch_size (int): Overrides the agent batch size. Defaults to None.
+        n_process (int): Overrides the agent process count. Defaults to None.
 
         Returns:
         list: A list of strings with copyright holder entities replaced.
         """
 
-        new_data = []
-        for sentence in data:
-            # Process the sentence using the entity recognizer
-            doc = self.entity_recognizer(sentence)
-            new_sentence = doc.text
-            for entity in doc.ents:
-                # If the entity is a copyright holder entity, replace it with
-                # ' ENTITY '
-                if entity.label_ == "ENT":
-                    new_sentence = re.sub(
-                        re.escape(entity.text), " ENTITY ", new_sentence
-                    )
-            new_data.append(new_sentence)
-        return new_data
+        # Process the sentences in batches using the entity recognizer
+        model = self.entity_recognizer
+        with self._stage("entity_recognizer", len(data)):
+            with self._memory_zone(model):
+                return self._pipe(
+                    model,
+                    data,
+                    self._replace_entity_spans,
+                    "".join,
+                    batch_size,
+                    n_process,
+                )
+
+    def _replace_entity_spans(self, doc):
+        """
+        Rebuilds the text of a doc with its copyright holder entities replaced
+        by ' ENTITY ', using the entity character offsets.
+
+        Only the detected spans are replaced, in a single pass over the text;
+        other occurrences of the same text are kept.
+
+        Parameters:
+        doc (Doc): A doc processed by the entity recognizer.
+
+        Returns:
+        str: The text with copyright holder entities replaced.
+        """
+
+        text = doc.text
+        pieces = []
+        end = 0
+        for entity in doc.ents:
+            # If the entity is a copyright holder entity, replace it with
+            # ' ENTITY '
+            if entity.label_ == "ENT":
+                pieces.append(text[end:entity.start_char])
+                pieces.append(" ENTITY ")
+                end = entity.end_char
+        pieces.append(text[end:])
+        return "".join(pieces)
 
     def _perform_text_substitutions(self, data):
         """
         Performs a series of text substitutions to clean and standardize the
-        data.
+        data, using the agent's TextNormalizer.
 
         This includes:
         - Replacing four-digit numbers (assumed to be years) with ' DATE '.
@@ -166,36 +804,11 @@ class SafaaAgent:
         list: A list of cleaned and standardized strings.
         """
 
-        # Define the substitution patterns and their replacements
-        subs = [
-            (r"\d{4}", " DATE "),
-            (r"\d+", " "),
-            (r"©", " COPYRIGHTSYMBOL "),
-            (r"\(c\)", " COPYRIGHTSYMBOL "),
-            (r"\(C\)", " COPYRIGHTSYMBOL "),
-            (
-                r"""(?:[a-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[a-z0-9!#$%&'*+/=?^_`{|}~-]+)*|"
-                (?:[\x01-\x08\x0b\x0c\x0e-\x1f\x21\x23-\x5b\x5d-\x7f]|
-                \\[\x01-\x09\x0b\x0c\x0e-\x7f])*")@
-                (?:(?:[a-z0-9](?:[a-z0-9-]*[a-z0-9])?\.)+[a-z0-9]
-                (?:[a-z0-9-]*[a-z0-9])?|\[(?:(?:(2(5[0-5]|[0-4][0-9])|
-                1[0-9][0-9]|[1-9]?[0-9]))\.){3}(?:(2(5[0-5]|[0-4][0-9])|
-                1[0-9][0-9]|[1-9]?[0-9])|[a-z0-9-]*[a-z0-9]:(
-                [\x01-\x08\x0b\x0c\x0e-\x1f\x21-\x5a\x53-\x7f]|
-                \\[\x01-\x09\x0b\x0c\x0e-\x7f])+)])""",
-                " EMAIL ",
-            ),
-            (r"[^a-zA-Z0-9]", " "),
-        ]
-        # Perform the substitutions for each pattern in the list
-        for pattern, replacement in subs:
-            data = [
-                re.sub(pattern, replacement, sentence) for sentence in data
-            ]
-        # Convert text to lowercase and strip extra whitespace
-        return [sentence.lower().strip() for sentence in data]
+        # Apply the precompiled substitution chain to each sentence
+        with self._stage("text_substitutions", len(data)):
+            return list(self.normalizer.normalize_all(data))
 
-    def predict(self, data, threshold=0.5):
+    def predict(self, data, threshold=0.5, batch_size=None, n_process=None):
         """
         Predicts false positives in the given data.
 
@@ -203,36 +816,325 @@ class SafaaAgent:
         data (iterable): The data to predict.
         threshold (float): The probability threshold for classification.
                            Defaults to 0.5.
+        batch_size (int): Overrides the agent batch size. Defaults to None.
+        n_process (int): Overrides the agent process count. Defaults to None.
 
         Returns:
         list: The predictions.
         """
 
-        # Preprocess the data before making predictions
-        data = self.preprocess_data(data)
+        # Adopt a staged model version between calls
+        self._swap_models()
+
+        with self._lock.read():
+            # Collapse identical inputs before the expensive stages
+            data = self._ensure_list_of_strings(data)
+            unique, inverse = self._deduplicate(data)
+            self.dedup_stats["predict"] = self._dedup_ratio(data, unique)
+
+            # Predict the distinct inputs, reusing the cached predictions
+            predictions = self._cached(
+                self._predict_namespace(threshold),
+                "predict",
+                unique,
+                lambda texts: self._predict(
+                    texts, threshold, batch_size, n_process
+                ),
+            )
 
-        # Vectorize the preprocessed data using the pre-trained vectorizer
-        data = self.vectorizer.transform(data)
+            # Scatter the predictions back to the original order
+            return [predictions[i] for i in inverse]
 
-        # Check if the model supports probability prediction
-        if hasattr(self.false_positive_detector, "predict_proba"):
-            # Get probability predictions from the model
-            predictions = self.false_positive_detector.predict_proba(data)
-            # Classify based on the given threshold. If the threshhold is not
-            # met, automatically sets the prediction to true
-            return [
-                "f" if prediction[1] >= threshold else "t"
-                for prediction in predictions
+    def _predict(self, data, threshold=0.5, batch_size=None, n_process=None):
+        """
+        Predicts false positives in the given data, without using the cache.
+
+        Parameters:
+        data (list): A list of strings.
+        threshold (float): The probability threshold for classification.
+                           Defaults to 0.5.
+        batch_size (int): Overrides the agent batch size. Defaults to None.
+        n_process (int): Overrides the agent process count. Defaults to None.
+
+        Returns:
+        list: The predictions.
+        """
+
+        # Preprocess the data before making predictions, leaving out the
+        # strings the prefilter labels
+        return self._prefiltered(
+            data,
+            lambda texts: self._classify(
+                self.preprocess_data(texts, batch_size, n_process), threshold
+            ),
+        )
+
+    def _namespace(self, kind):
+        """
+        Returns the cache namespace of a kind of result, which depends on how
+        the strings over the character budget are handled.
+        """
+
+        if not self.max_chars:
+            return kind
+        return f"{kind}:{self.max_chars}:{self.overflow}"
+
+    def _predict_namespace(self, threshold):
+        """
+        Returns the cache namespace of predictions, which depend on the
+        threshold, the prefilter rules and the character budget.
+        """
+
+        namespace = self._namespace(f"predict:{threshold!r}")
+        if self.prefilter is None:
+            return namespace
+        return f"{namespace}:{self.prefilter.key}"
+
+    def _prefilter_labels(self, data):
+        """
+        Labels the strings with the prefilter.
+
+        Parameters:
+        data (list): A list of strings.
+
+        Returns:
+        list: The label of each string, or None for the strings left to the
+              models.
+        """
+
+        with self._stage("prefilter", len(data)):
+            return self.prefilter.label_all(data)
+
+    def _prefiltered(self, data, compute):
+        """
+        Predicts the strings the prefilter labels, if enabled, and computes
+        the predictions of the others.
+
+        Parameters:
+        data (list): A list of strings.
+        compute (callable): Computes the predictions of a list of strings.
+
+        Returns:
+        list: The predictions.
+        """
+
+        if self.prefilter is None:
+            return compute(data)
+        predictions = self._prefilter_labels(data)
+        undecided = [i for i, p in enumerate(predictions) if p is None]
+        if undecided:
+            computed = compute([data[i] for i in undecided])
+            for i, prediction in zip(undecided, computed):
+                predictions[i] = prediction
+        return predictions
+
+    def predict_array(
+        self,
+        data,
+        threshold=0.5,
+        return_scores=False,
+        batch_size=None,
+        n_process=None,
+    ):
+        """
+        Predicts false positives in the given data as NumPy arrays.
+
+        With a detector supporting probability prediction, a sequence of
+        thresholds sweeps them in one call. Other detectors ignore the
+        threshold, like predict.
+
+        Parameters:
+        data (iterable): The data to predict.
+        threshold (float or sequence): The probability threshold, or
+                                       thresholds, for classification.
+                                       Defaults to 0.5.
+        return_scores (bool): Flag to also return the scores. Defaults to
+                              False.
+        batch_size (int): Overrides the agent batch size. Defaults to None.
+        n_process (int): Overrides the agent process count. Defaults to None.
+
+        Returns:
+        ndarray: The boolean labels, True for false positives, of shape
+                 (len(data),), or (len(thresholds), len(data)) for a
+                 sequence of thresholds.
+        ndarray: If return_scores is set, the false positive probability of
+                 each string, or its decision value for detectors without
+                 probability prediction.
+        """
+
+        import numpy as np
+
+        # Adopt a staged model version between calls
+        self._swap_models()
+
+        with self._lock.read():
+            # Collapse identical inputs before the expensive stages
+            data = self._ensure_list_of_strings(data)
+            unique, inverse = self._deduplicate(data)
+            self.dedup_stats["predict"] = self._dedup_ratio(data, unique)
+
+            # Score the distinct inputs, reusing the cached scores. The scores
+            # do not depend on the threshold, and are cached as exact strings
+            scores = self._cached(
+                self._namespace("score"),
+                "predict",
+                unique,
+                lambda texts: [
+                    repr(score)
+                    for score in self._predict_scores(
+                        texts, batch_size, n_process
+                    ).tolist()
+                ],
+            )
+            scores = np.array(scores, dtype=np.float64)[
+                np.asarray(inverse, dtype=np.intp)
             ]
 
-        # Get binary predictions from the model if probability prediction is not
-        # supported
-        return [
-            "f" if prediction == 1 else "t"
-            for prediction in self.false_positive_detector.predict(data)
+            labels = self._labels(scores, threshold)
+            return (labels, scores) if return_scores else labels
+
+    def _predict_scores(self, data, batch_size=None, n_process=None):
+        """
+        Scores the given data, without using the cache.
+
+        Parameters:
+        data (list): A list of strings.
+        batch_size (int): Overrides the agent batch size. Defaults to None.
+        n_process (int): Overrides the agent process count. Defaults to None.
+
+        Returns:
+        ndarray: The scores.
+        """
+
+        return self._score(self.preprocess_data(data, batch_size, n_process))
+
+    def _classify(self, data, threshold=0.5):
+        """
+        Classifies preprocessed strings with the false positive detector.
+
+        Parameters:
+        data (list): A list of preprocessed strings.
+        threshold (float): The probability threshold for classification.
+                           Defaults to 0.5.
+
+        Returns:
+        list: The predictions.
+        """
+
+        import numpy as np
+
+        labels = self._labels(self._score(data), threshold)
+        return np.where(labels, "f", "t").tolist()
+
+    def _score(self, data):
+        """
+        Scores preprocessed strings with the false positive detector.
+
+        Parameters:
+        data (list): A list of preprocessed strings.
+
+        Returns:
+        ndarray: The false positive probability of each string, or its
+                 decision value for detectors without probability
+                 prediction.
+        """
+
+        import numpy as np
+
+        # Score each distinct preprocessed string only once
+        data, inverse = self._deduplicate(data)
+        self.dedup_stats.setdefault("predict", {})["unique_normalized"] = len(
+            data
+        )
+
+        # Score the data in plain Python when the models allow it
+        scorer = self._linear_scorer()
+        if scorer is not None:
+            with self._stage("score", len(data)):
+                scores = (
+                    scorer.predict_proba(data)
+                    if scorer.probabilistic
+                    else scorer.decision_function(data)
+                )
+            return np.array(scores, dtype=np.float64)[
+                np.asarray(inverse, dtype=np.intp)
+            ]
+
+        # Vectorize the preprocessed data using the pre-trained vectorizer
+        vectorizer = self.vectorizer
+        with self._stage("vectorize", len(data)):
+            data = vectorizer.transform(data)
+
+        # Check if the model supports probability prediction
+        detector = self.false_positive_detector
+        with self._stage("classify", data.shape[0]):
+            if hasattr(detector, "predict_proba"):
+                scores = detector.predict_proba(data)[:, 1]
+            else:
+                scores = detector.decision_function(data)
+
+        return np.asarray(scores, dtype=np.float64)[
+            np.asarray(inverse, dtype=np.intp)
         ]
 
-    def declutter(self, data, predictions):
+    def _labels(self, scores, threshold=0.5):
+        """
+        Turns scores into boolean labels, True for false positives.
+
+        Parameters:
+        scores (ndarray): The scores of the strings.
+        threshold (float or sequence): The probability threshold, or
+                                       thresholds, for classification.
+                                       Defaults to 0.5.
+
+        Returns:
+        ndarray: The labels, with a leading threshold axis for a sequence of
+                 thresholds.
+        """
+
+        import numpy as np
+
+        threshold = np.asarray(threshold, dtype=np.float64)
+        detector = self.false_positive_detector
+        if hasattr(detector, "predict_proba"):
+            # Compare the probabilities with every threshold at once
+            if threshold.ndim:
+                return scores[np.newaxis, :] >= threshold[:, np.newaxis]
+            return scores >= threshold
+
+        # Without probabilities the threshold is ignored and the label is
+        # the class the detector predicts
+        if threshold.ndim:
+            raise ValueError(
+                "Threshold sweeps require a detector with predict_proba"
+            )
+        classes = np.asarray(detector.classes_)
+        return classes[(scores > 0).astype(int)] == 1
+
+    def _linear_scorer(self):
+        """
+        Returns the LinearScorer of the loaded vectorizer and false positive
+        detector, creating it on first use.
+
+        Returns:
+        LinearScorer: The scorer, or None if the models are not supported.
+        """
+
+        # False records that the loaded models are not supported
+        if self._scorer is None:
+            from .scorer import LinearScorer
+
+            with self._load_lock:
+                if self._scorer is None:
+                    self._scorer = (
+                        LinearScorer.from_models(
+                            self.vectorizer, self.false_positive_detector
+                        )
+                        or False
+                    )
+        return self._scorer or None
+
+    def declutter(self, data, predictions, batch_size=None, n_process=None):
         """
         Cleans up a copyright notice by removing extra text based on the
         predictions.
@@ -240,24 +1142,539 @@ class SafaaAgent:
         Parameters:
         data (iterable): The data to declutter.
         predictions (list): The predictions indicating false positives.
+        batch_size (int): Overrides the agent batch size. Defaults to None.
+        n_process (int): Overrides the agent process count. Defaults to None.
 
         Returns:
         list: The decluttered data.
         """
 
-        # Iterate over each sentence and its corresponding prediction
-        # Remove text from sentences marked as false positives, and keep the
-        # entities (copyrights) in other sentences
-        return [
-            (
-                ""
-                if prediction == "f"
-                else " ".join(
-                    [ent.text for ent in self.declutter_model(sentence).ents]
+        # Adopt a staged model version between calls
+        self._swap_models()
+
+        with self._lock.read():
+            # Remove text from sentences marked as false positives
+            pairs = list(zip(data, predictions))
+            decluttered = ["" for _ in pairs]
+
+            # Keep the entities (copyrights) in other sentences, running the
+            # declutter model only once over each distinct sentence
+            indices = [
+                i
+                for i, (_, prediction) in enumerate(pairs)
+                if prediction != "f"
+            ]
+            texts = [str(pairs[i][0]) for i in indices]
+            unique, inverse = self._deduplicate(texts)
+            self.dedup_stats["declutter"] = self._dedup_ratio(texts, unique)
+            unique = self._cached(
+                self._namespace("declutter"),
+                "declutter",
+                unique,
+                lambda texts: self._declutter(texts, batch_size, n_process),
+            )
+            for i, j in zip(indices, inverse):
+                decluttered[i] = unique[j]
+            return decluttered
+
+    def _declutter(self, data, batch_size=None, n_process=None):
+        """
+        Keeps only the copyright entities of each string, without using the
+        cache.
+
+        Parameters:
+        data (list): A list of strings.
+        batch_size (int): Overrides the agent batch size. Defaults to None.
+        n_process (int): Overrides the agent process count. Defaults to None.
+
+        Returns:
+        list: The decluttered strings.
+        """
+
+        # Run the declutter model over the strings, in batches
+        model = self.declutter_model
+        with self._stage("declutter", len(data)):
+            with self._memory_zone(model):
+                return self._pipe(
+                    model,
+                    data,
+                    lambda doc: " ".join([ent.text for ent in doc.ents]),
+                    lambda parts: " ".join([part for part in parts if part]),
+                    batch_size,
+                    n_process,
                 )
+
+    def process(self, data, threshold=0.5, batch_size=None, n_process=None):
+        """
+        Predicts false positives in the given data and declutters the other
+        strings in a single pass.
+
+        When both spaCy models use the same tokenizer, each string is
+        tokenized only once and the declutter model only runs over the
+        strings not predicted as false positives.
+
+        Parameters:
+        data (iterable): The data to predict and declutter.
+        threshold (float): The probability threshold for classification.
+                           Defaults to 0.5.
+        batch_size (int): Overrides the agent batch size. Defaults to None.
+        n_process (int): Overrides the agent process count. Defaults to None.
+
+        Returns:
+        list: (prediction, decluttered text) pairs, in input order.
+        """
+
+        # Adopt a staged model version between calls
+        self._swap_models()
+
+        with self._lock.read():
+            # Collapse identical inputs before the expensive stages
+            data = self._ensure_list_of_strings(data)
+            unique, inverse = self._deduplicate(data)
+            self.dedup_stats["predict"] = self._dedup_ratio(data, unique)
+
+            # Predict the distinct inputs, keeping the decluttered strings the
+            # fused pass computes along the way
+            decluttered = {}
+
+            def compute(texts):
+                predictions, texts_decluttered = self._process(
+                    texts, threshold, batch_size, n_process
+                )
+                decluttered.update(zip(texts, texts_decluttered))
+                return predictions
+
+            predictions = self._cached(
+                self._predict_namespace(threshold), "predict", unique, compute
             )
-            for sentence, prediction in zip(data, predictions)
+
+            # Declutter the strings not predicted as false positives, running
+            # the declutter model only over those the fused pass did not cover
+            indices = [i for i, p in enumerate(predictions) if p != "f"]
+
+            def compute_declutter(texts):
+                missing = [text for text in texts if text not in decluttered]
+                decluttered.update(
+                    zip(
+                        missing,
+                        self._declutter(missing, batch_size, n_process),
+                    )
+                )
+                return [decluttered[text] for text in texts]
+
+            texts = self._cached(
+                self._namespace("declutter"),
+                "declutter",
+                [unique[i] for i in indices],
+                compute_declutter,
+            )
+            results = [(prediction, "") for prediction in predictions]
+            for i, text in zip(indices, texts):
+                results[i] = (predictions[i], text)
+
+            # Scatter the results back to the original order
+            return [results[i] for i in inverse]
+
+    def _process(self, data, threshold=0.5, batch_size=None, n_process=None):
+        """
+        Predicts and declutters the given data, without using the cache.
+
+        Parameters:
+        data (list): A list of strings.
+        threshold (float): The probability threshold for classification.
+                           Defaults to 0.5.
+        batch_size (int): Overrides the agent batch size. Defaults to None.
+        n_process (int): Overrides the agent process count. Defaults to None.
+
+        Returns:
+        tuple: The predictions and the decluttered strings, which are empty
+               for false positives.
+        """
+
+        if self.prefilter is None:
+            return self._process_models(data, threshold, batch_size, n_process)
+
+        # Run the fused pass over the strings the prefilter leaves to the
+        # models, and only the declutter model over the prefiltered strings
+        # not labelled as false positives
+        predictions = self._prefilter_labels(data)
+        decluttered = ["" for _ in data]
+        undecided = [i for i, p in enumerate(predictions) if p is None]
+        indices = [
+            i for i, p in enumerate(predictions) if p not in (None, "f")
         ]
+        if undecided:
+            results = self._process_models(
+                [data[i] for i in undecided], threshold, batch_size, n_process
+            )
+            for i, prediction, text in zip(undecided, *results):
+                predictions[i] = prediction
+                decluttered[i] = text
+        if indices:
+            texts = self._declutter(
+                [data[i] for i in indices], batch_size, n_process
+            )
+            for i, text in zip(indices, texts):
+                decluttered[i] = text
+        return predictions, decluttered
+
+    def _process_models(
+        self, data, threshold=0.5, batch_size=None, n_process=None
+    ):
+        """
+        Predicts and declutters the given data with the models.
+
+        Parameters:
+        data (list): A list of strings.
+        threshold (float): The probability threshold for classification.
+                           Defaults to 0.5.
+        batch_size (int): Overrides the agent batch size. Defaults to None.
+        n_process (int): Overrides the agent process count. Defaults to None.
+
+        Returns:
+        tuple: The predictions and the decluttered strings, which are empty
+               for false positives.
+        """
+
+        decluttered = ["" for _ in data]
+
+        # Fall back to separate passes when the tokenizers differ, when the
+        # docs would have to be sent to other processes, or when long strings
+        # are split into windows
+        if (
+            (n_process or self.n_process) > 1
+            or self.max_chars
+            or not self._tokenizer_shared()
+        ):
+            predictions = self._predict(data, threshold, batch_size, n_process)
+            indices = [i for i, p in enumerate(predictions) if p != "f"]
+            texts = self._declutter(
+                [data[i] for i in indices], batch_size, n_process
+            )
+            for i, text in zip(indices, texts):
+                decluttered[i] = text
+            return predictions, decluttered
+
+        # Load the models before entering the memory zone, which loading into
+        # a shared vocab waits for
+        entity_recognizer = self.entity_recognizer
+        declutter_model = self.declutter_model
+        self._linear_scorer()
+        batch_size = batch_size or self.batch_size
+        with self._memory_zone(entity_recognizer):
+            # Tokenize each string once, keeping an untouched copy of each
+            # doc for the declutter model
+            with self._stage("tokenize", len(data)):
+                docs = list(entity_recognizer.tokenizer.pipe(data, batch_size))
+                copies = [doc.copy() for doc in docs]
+
+            # Replace the copyright holder entities and classify the strings,
+            # running the entity recognizer in length order
+            with self._stage("entity_recognizer", len(data)):
+                order = self._length_order(docs)
+                replaced = [None] * len(docs)
+                for i, doc in zip(
+                    order,
+                    entity_recognizer.pipe(
+                        (docs[i] for i in order), batch_size=batch_size
+                    ),
+                ):
+                    replaced[i] = self._replace_entity_spans(doc)
+            predictions = self._classify(
+                self._perform_text_substitutions(replaced), threshold
+            )
+
+            # Run the declutter model only over the strings not predicted as
+            # false positives
+            indices = [i for i, p in enumerate(predictions) if p != "f"]
+            if self.sort_by_length:
+                indices.sort(key=lambda i: len(copies[i]))
+            if indices:
+                # Memory zones must not be nested over a shared vocab
+                zone = (
+                    nullcontext()
+                    if declutter_model.vocab is entity_recognizer.vocab
+                    else self._memory_zone(declutter_model)
+                )
+                with self._stage("declutter", len(indices)):
+                    with zone:
+                        docs = declutter_model.pipe(
+                            (copies[i] for i in indices), batch_size=batch_size
+                        )
+                        for i, doc in zip(indices, docs):
+                            decluttered[i] = " ".join(
+                                [ent.text for ent in doc.ents]
+                            )
+
+        return predictions, decluttered
+
+    def _tokenizer_shared(self):
+        """
+        Checks whether both spaCy models tokenize text identically, so that
+        docs tokenized for the entity recognizer can be decluttered too.
+
+        Returns:
+        bool: True if the tokenizers are identical.
+        """
+
+        if self._shared_tokenizer is None:
+            with self._load_lock:
+                if self._shared_tokenizer is None:
+                    self._shared_tokenizer = self._compare_tokenizers()
+        return self._shared_tokenizer
+
+    def _compare_tokenizers(self):
+        """
+        Compares the tokenizers of both spaCy models, adding the entity
+        labels of the declutter model to the vocab of the entity recognizer
+        if they are identical.
+        """
+
+        entity_recognizer = self.entity_recognizer
+        declutter_model = self.declutter_model
+        shared = (
+            entity_recognizer.lang == declutter_model.lang
+            and entity_recognizer.tokenizer.to_bytes(exclude=["vocab"])
+            == declutter_model.tokenizer.to_bytes(exclude=["vocab"])
+        )
+        if shared:
+            # The entity labels of the declutter model must be known to the
+            # vocab of the shared docs, outside the memory zones of
+            # concurrent calls
+            with self._zones.exclusive(entity_recognizer.vocab):
+                for _, component in declutter_model.pipeline:
+                    for label in getattr(component, "labels", ()):
+                        entity_recognizer.vocab.strings.add(label)
+        return shared
+
+    def _iter_chunks(self, data, chunk_size=None):
+        """
+        Splits any iterable into lists of at most chunk_size items, consuming
+        it lazily.
+
+        Parameters:
+        data (iterable): The data to split.
+        chunk_size (int): Number of items per chunk. Defaults to
+                          DEFAULT_CHUNK_SIZE.
+
+        Returns:
+        iterator: The chunks, as lists.
+        """
+
+        iterator = iter(data)
+        chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+        while True:
+            chunk = list(islice(iterator, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def predict_iter(
+        self,
+        data,
+        threshold=0.5,
+        chunk_size=None,
+        batch_size=None,
+        n_process=None,
+    ):
+        """
+        Lazily predicts false positives in data of any size, holding only one
+        chunk in memory at a time.
+
+        Parameters:
+        data (iterable): The data to predict.
+        threshold (float): The probability threshold for classification.
+                           Defaults to 0.5.
+        chunk_size (int): Number of strings predicted at once. Defaults to
+                          DEFAULT_CHUNK_SIZE.
+        batch_size (int): Overrides the agent batch size. Defaults to None.
+        n_process (int): Overrides the agent process count. Defaults to None.
+
+        Returns:
+        iterator: The predictions, in input order.
+        """
+
+        for chunk in self._iter_chunks(data, chunk_size):
+            yield from self.predict(chunk, threshold, batch_size, n_process)
+
+    def declutter_iter(
+        self,
+        data,
+        predictions,
+        chunk_size=None,
+        batch_size=None,
+        n_process=None,
+    ):
+        """
+        Lazily cleans up copyright notices of data of any size, holding only
+        one chunk in memory at a time.
+
+        Parameters:
+        data (iterable): The data to declutter.
+        predictions (iterable): The predictions indicating false positives.
+        chunk_size (int): Number of strings decluttered at once. Defaults to
+                          DEFAULT_CHUNK_SIZE.
+        batch_size (int): Overrides the agent batch size. Defaults to None.
+        n_process (int): Overrides the agent process count. Defaults to None.
+
+        Returns:
+        iterator: The decluttered data, in input order.
+        """
+
+        for chunk in self._iter_chunks(zip(data, predictions), chunk_size):
+            texts, chunk_predictions = zip(*chunk)
+            yield from self.declutter(
+                list(texts), list(chunk_predictions), batch_size, n_process
+            )
+
+    def classify_and_declutter_iter(
+        self,
+        data,
+        threshold=0.5,
+        chunk_size=None,
+        batch_size=None,
+        n_process=None,
+    ):
+        """
+        Lazily predicts and declutters data of any size, holding only one
+        chunk in memory at a time.
+
+        Parameters:
+        data (iterable): The data to predict and declutter.
+        threshold (float): The probability threshold for classification.
+                           Defaults to 0.5.
+        chunk_size (int): Number of strings processed at once. Defaults to
+                          DEFAULT_CHUNK_SIZE.
+        batch_size (int): Overrides the agent batch size. Defaults to None.
+        n_process (int): Overrides the agent process count. Defaults to None.
+
+        Returns:
+        iterator: (prediction, decluttered text) pairs, in input order.
+        """
+
+        for chunk in self._iter_chunks(data, chunk_size):
+            yield from self.process(chunk, threshold, batch_size, n_process)
+
+    def watch(self, registry, interval=DEFAULT_WATCH_INTERVAL):
+        """
+        Watches a model registry from a background thread, which loads each
+        new current version while the agent keeps serving with its models.
+        The agent adopts the loaded version at its next predict, declutter
+        or process call, swapping all four models at once.
+
+        Parameters:
+        registry (ModelRegistry): The registry to watch.
+        interval (float): Seconds between checks of the current version.
+                          Defaults to DEFAULT_WATCH_INTERVAL.
+        """
+
+        self.stop_watching()
+
+        # The agent already serves the current version if it was created
+        # from its directory
+        version = registry.current()
+        if version is not None and os.path.realpath(
+            self.model_dir
+        ) == os.path.realpath(registry.version_path(version)):
+            self.model_version = version
+
+        stop = threading.Event()
+        thread = threading.Thread(
+            target=self._watch, args=(registry, interval, stop), daemon=True
+        )
+        self._watcher = (thread, stop)
+        thread.start()
+
+    def stop_watching(self):
+        """
+        Stops watching the model registry, if watched.
+        """
+
+        if self._watcher is not None:
+            thread, stop = self._watcher
+            stop.set()
+            thread.join()
+            self._watcher = None
+
+    def _watch(self, registry, interval, stop):
+        """
+        Stages each new current version of a registry until stopped.
+        """
+
+        while True:
+            version = registry.current()
+            staged = self._staged
+            if version is not None and version not in (
+                self.model_version,
+                staged and staged[0],
+            ):
+                try:
+                    self._stage_version(registry, version)
+                except Exception as error:
+                    print(
+                        f"Could not load model version {version}: {error}",
+                        file=sys.stderr,
+                    )
+            if stop.wait(interval):
+                return
+
+    def _stage_version(self, registry, version):
+        """
+        Verifies and loads all the models of a registry version into a copy
+        of the agent, to be swapped in between calls.
+
+        Parameters:
+        registry (ModelRegistry): The registry.
+        version (str): The version name.
+        """
+
+        registry.verify(version)
+        staged = self._staging_copy()
+        staged._set_model_dir(registry.version_path(version))
+        staged._load_models(eager=True)
+        staged._linear_scorer()
+        self._staged = (version, staged)
+
+    def _staging_copy(self):
+        """
+        Copies the agent to stage a model version into. The copy shares the
+        agent options, but loads its own models under its own locks and
+        leaves the cache alone until it is swapped in.
+
+        Returns:
+        SafaaAgent: The copy.
+        """
+
+        staged = copy.copy(self)
+        staged.cache = None
+        staged._watcher = None
+        staged._init_locks()
+        return staged
+
+    def _swap_models(self):
+        """
+        Adopts the staged model version, if any, replacing the models and
+        their paths at once.
+
+        Returns:
+        bool: True if a version was adopted.
+        """
+
+        if self._staged is None:
+            return False
+
+        # Wait for the calls using the current models to finish
+        with self._lock.write():
+            staged = self._staged
+            if staged is None:
+                return False
+            self._staged = None
+            version, agent = staged
+            for name in MODEL_STATE:
+                setattr(self, name, getattr(agent, name))
+            self.model_version = version
+            self._update_fingerprints()
+        return True
 
     def train_false_positive_detector_model(self, data, labels):
         """
@@ -268,73 +1685,371 @@ class SafaaAgent:
         labels (iterable): The labels for the training data.
         """
 
-        # Preprocess the data before training
-        preprocessed_data = self.preprocess_data(data)
-        # Fit the vectorizer to the preprocessed data
-        vectorized_data = self.vectorizer.transform(preprocessed_data)
-        # Train the false positive detector model
-        self.false_positive_detector.partial_fit(vectorized_data, labels)
+        # The compact models cannot be trained, so swap the pickles back in
+        self._use_pickles()
 
-    def train_ner_model(
-        self, train_path, dev_path, declutter_model=False, config_path=None
+        self._train_batch(data, labels)
+
+        # Drop the cached predictions of the previous model weights
+        with self._lock.write():
+            self._detector_trained = True
+            self._update_fingerprints()
+
+    def _train_batch(self, data, labels, classes=None):
+        """
+        Updates the false positive detector with one batch of data.
+
+        Parameters:
+        data (iterable): The data to train the model on.
+        labels (iterable): The labels for the training data.
+        classes (list): All the labels, required by the first update of an
+                        untrained detector. Defaults to None.
+        """
+
+        # Preprocess the data before training, alongside inference calls
+        preprocessed_data = self.preprocess_data(data)
+        # Train the false positive detector model once no inference call
+        # uses it
+        with self._lock.write():
+            # Fit the vectorizer to the preprocessed data
+            vectorized_data = self.vectorizer.transform(preprocessed_data)
+            with self._stage("train", len(preprocessed_data)):
+                self.false_positive_detector.partial_fit(
+                    vectorized_data, labels, classes=classes
+                )
+            # Rebuild the scorer from the updated weights on next use
+            self._scorer = None
+
+    def train_false_positive_detector_stream(
+        self,
+        data,
+        epochs=1,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        shuffle_buffer=DEFAULT_SHUFFLE_BUFFER,
+        checkpoint_path=None,
+        checkpoint_every=None,
+        resume=False,
+        classes=None,
+        random_state=0,
+        track_memory=False,
     ):
         """
-        Trains the named entity recognition model using the provided training and
-        development datasets.
+        Trains the false positive detector on a stream of labelled strings,
+        one mini-batch at a time, so that memory does not grow with the size
+        of the training data.
 
         Parameters:
-        train_path (str): The path to the training data file. Should be a .spacy file
-        dev_path (str): The path to the development data file. Should be a .spacy file
-        declutter_model (bool): Whether to train the declutter model or the entity recognizer model. Defaults to False.
-        config_path (str): The path to the configuration file. Defaults to None.
+        data (str, iterable or callable): A CSV file with copyright and
+                                          falsePositive columns, an iterable
+                                          of (text, label) pairs, or a
+                                          callable returning such an
+                                          iterable. Several epochs need a
+                                          file, a callable or a re-iterable
+                                          collection.
+        epochs (int): Number of passes over the data. Defaults to 1.
+        chunk_size (int): Number of strings per mini-batch. Defaults to
+                          DEFAULT_CHUNK_SIZE.
+        shuffle_buffer (int): Number of pairs buffered to shuffle the stream,
+                              0 keeping it in order. Defaults to
+                              DEFAULT_SHUFFLE_BUFFER.
+        checkpoint_path (str): Directory to save the models and the training
+                               progress to. Defaults to None.
+        checkpoint_every (int): Number of mini-batches between checkpoints,
+                                in addition to the end of each epoch.
+                                Defaults to None.
+        resume (bool): Flag to continue from the checkpoint in
+                       checkpoint_path, with its shuffling options. Defaults
+                       to False.
+        classes (list): All the labels, required if the detector has not
+                        been trained yet. Defaults to None.
+        random_state (int): Seed of the shuffling. Defaults to 0.
+        track_memory (bool): Flag to also record the peak memory allocated
+                             during each epoch using tracemalloc, which
+                             slows down allocations while enabled. Defaults
+                             to False.
+
+        Returns:
+        list: The samples, seconds and samples per second of each epoch
+              trained, with the peak resident memory in bytes the process
+              has reached by its end, model loading included, and the peak
+              memory in bytes allocated during the epoch if tracked.
         """
 
-        # Determine the configuration file path
-        cfg_path = config_path or CONFIGS_DIR
-        config_file_path = os.path.join(cfg_path, "train.cfg")
+        if shuffle_buffer < 0:
+            raise ValueError(
+                f"shuffle_buffer must not be negative: {shuffle_buffer}"
+            )
+        pairs = self._training_pairs(data, epochs)
+        progress = {
+            "epoch": 0,
+            "samples": 0,
+            "shuffle_buffer": shuffle_buffer,
+            "random_state": random_state,
+            "completed": False,
+        }
+
+        # Continue from the models and the position of the checkpoint
+        if resume:
+            if checkpoint_path is None:
+                raise ValueError("Resuming requires a checkpoint path")
+            progress_path = os.path.join(
+                checkpoint_path, TRAINING_PROGRESS_FILE
+            )
+            if os.path.exists(progress_path):
+                with open(progress_path, "r", encoding="utf-8") as file:
+                    progress = json.load(file)
+                self._load_checkpoint(checkpoint_path)
+
+        # The compact models cannot be trained, so swap the pickles back in
+        self._use_pickles()
+        detector = self.false_positive_detector
+        if classes is None and hasattr(detector, "classes_"):
+            classes = detector.classes_
+
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+        history = []
+        for epoch in range(progress["epoch"], epochs):
+            if track_memory:
+                tracemalloc.reset_peak()
+                start_memory = tracemalloc.get_traced_memory()[0]
+                peak_memory = 0
+            start = time.perf_counter()
+            skip = progress["samples"] if epoch == progress["epoch"] else 0
+            samples = skip
+            batches = 0
+
+            # Replay the shuffled order of the epoch, skipping the samples
+            # trained on before the checkpoint
+            rng = random.Random(f"{progress['random_state']}:{epoch}")
+            stream = islice(
+                _shuffled(pairs(), progress["shuffle_buffer"], rng),
+                skip,
+                None,
+            )
+            for chunk in self._iter_chunks(stream, chunk_size):
+                texts, labels = zip(*chunk)
+                self._train_batch(list(texts), list(labels), classes)
+                # Read the peak after each batch, since the stages of a
+                # profiler tracking memory reset it too
+                if track_memory:
+                    peak_memory = max(
+                        peak_memory,
+                        tracemalloc.get_traced_memory()[1] - start_memory,
+                    )
+                samples += len(chunk)
+                batches += 1
+                if (
+                    checkpoint_path is not None
+                    and checkpoint_every
+                    and batches % checkpoint_every == 0
+                ):
+                    self._save_checkpoint(
+                        checkpoint_path,
+                        dict(progress, epoch=epoch, samples=samples),
+                    )
 
-        # Read the configuration file
-        with open(config_file_path, "r", encoding="utf-8") as file:
-            cfg_contents = file.read()
+            seconds = time.perf_counter() - start
+            stats = {
+                "epoch": epoch,
+                "samples": samples - skip,
+                "seconds": seconds,
+                "samples_per_second": (
+                    (samples - skip) / seconds if seconds else 0.0
+                ),
+                "process_peak_rss": _peak_rss(),
+            }
+            if track_memory:
+                stats["peak_memory"] = peak_memory
+            history.append(stats)
+            if checkpoint_path is not None:
+                self._save_checkpoint(
+                    checkpoint_path,
+                    dict(
+                        progress,
+                        epoch=epoch + 1,
+                        samples=0,
+                        completed=epoch + 1 == epochs,
+                    ),
+                )
 
-        # Update the training and development data paths in the configuration
-        # contents
-        updated_cfg_contents = re.sub(
-            r'train\s*=\s*".*"',
-            f'train = "{train_path}"',
-            re.sub(r'dev\s*=\s*".*"', f'dev = "{dev_path}"', cfg_contents),
-        )
+        # Drop the cached predictions of the previous model weights
+        with self._lock.write():
+            self._detector_trained = True
+            self._update_fingerprints()
+        return history
 
-        # Write the updated configuration to a temporary file
-        tmp_cfg_path = os.path.join(cfg_path, "tmp.cfg")
-        with open(tmp_cfg_path, "w", encoding="utf-8") as file:
-            file.write(updated_cfg_contents)
+    def _training_pairs(self, data, epochs=1):
+        """
+        Returns a callable creating a fresh iterator over the (text, label)
+        pairs of the training data, for each epoch.
+        """
 
-        # Determine the model directory paths
-        tmp_model_path = os.path.join(LOCAL_MODEL_DIR, "tmp")
-        new_model_dir = (
-            "declutter_model" if declutter_model else "entity_recognizer"
-        )
-        new_model_path = os.path.join(LOCAL_MODEL_DIR, new_model_dir)
+        if isinstance(data, str):
+            path = data
+
+            def pairs():
+                with open(path, "r", encoding="utf-8", newline="") as file:
+                    for row in csv.DictReader(file):
+                        yield row["copyright"], int(row["falsePositive"])
+
+            return pairs
+        if callable(data):
+            return data
+        if epochs > 1 and iter(data) is data:
+            raise ValueError(
+                "Several epochs need a file, a callable or a re-iterable "
+                "collection, not an iterator"
+            )
+        return lambda: iter(data)
 
-        # Create the new model directory if it doesn't exist
-        os.makedirs(new_model_path, exist_ok=True)
+    def _save_checkpoint(self, path, progress):
+        """
+        Saves the models and then the training progress, so that the
+        progress never refers to models that were not saved.
+        """
 
-        # Construct the training command and execute it
-        train_command = (
-            f"python -m spacy train '{tmp_cfg_path}' "
-            f"--output '{tmp_model_path}'"
+        self.save(path)
+        progress_path = os.path.join(path, TRAINING_PROGRESS_FILE)
+        with open(progress_path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(progress, file)
+        os.replace(progress_path + ".tmp", progress_path)
+
+    def _load_checkpoint(self, path):
+        """
+        Loads the vectorizer and the false positive detector saved in a
+        checkpoint directory.
+        """
+
+        from joblib import load
+
+        self._use_pickles()
+        self.false_positive_detector = load(
+            os.path.join(path, "false_positive_detection_model_sgd.pkl")
         )
-        os.system(train_command)
+        self.vectorizer = load(
+            os.path.join(path, "false_positive_detection_vectorizer.pkl")
+        )
+
+    def _use_pickles(self):
+        """
+        Replaces the compact vectorizer and false positive detector with the
+        scikit-learn models loaded from the pickles, which can be trained and
+        saved.
+        """
+
+        if self.compact:
+            with self._lock.write():
+                if self.compact:
+                    self.compact = False
+                    for name in COMPACT_MODELS:
+                        self._models.pop(name, None)
+                    self._scorer = None
+                    self._update_fingerprints()
+
+    def train_ner_model(
+        self,
+        train_path,
+        dev_path,
+        declutter_model=False,
+        config_path=None,
+        warm_start=False,
+        n_threads=None,
+        output_path=None,
+        overrides=None,
+    ):
+        """
+        Trains the named entity recognition model using the provided training and
+        development datasets.
+
+        The training runs in-process with spaCy's training loop, and the best
+        pipeline replaces the one used by the agent as soon as it is saved.
 
-        # Move the trained model files to the new model directory
-        self._move_files(
-            os.path.join(tmp_model_path, "model-best"), new_model_path
+        Parameters:
+        train_path (str): The path to the training data. Should be a .spacy file or a directory of them
+        dev_path (str): The path to the development data. Should be a .spacy file or a directory of them
+        declutter_model (bool): Whether to train the declutter model or the entity recognizer model. Defaults to False.
+        config_path (str): The path to the directory of the train.cfg configuration file. Defaults to None.
+        warm_start (bool): Whether to continue training a copy of the loaded pipeline instead of a new one from the
+                           configuration file. Defaults to False.
+        n_threads (int): Maximum number of threads of the numerical libraries. Defaults to None, leaving them unchanged.
+        output_path (str): The directory to save the trained pipeline to. Defaults to the model directory under
+                           LOCAL_MODEL_DIR.
+        overrides (dict): Configuration values to override, by dotted name, e.g. {"training.max_steps": 1000}.
+                          Defaults to None.
+        """
+
+        from spacy.training.initialize import init_nlp
+        from spacy.training.loop import train as train_nlp
+        from spacy.util import (
+            dot_to_dict,
+            ensure_path,
+            load_config,
+            load_model_from_config,
         )
+        from threadpoolctl import threadpool_limits
+
+        name = "declutter_model" if declutter_model else "entity_recognizer"
+        overrides = {
+            "paths.train": str(train_path),
+            "paths.dev": str(dev_path),
+            **(overrides or {}),
+        }
+
+        if warm_start:
+            # Copy the loaded pipeline, so that the agent keeps using it while
+            # the copy trains, and point its configuration to the datasets
+            with self._lock.read():
+                current = getattr(self, name)
+                nlp = load_model_from_config(current.config)
+                nlp.from_bytes(current.to_bytes())
+            nlp.config = nlp.config.merge(dot_to_dict(overrides))
+        else:
+            # Initialize a new pipeline from the configuration file
+            cfg_path = config_path or CONFIGS_DIR
+            config = load_config(
+                os.path.join(cfg_path, "train.cfg"),
+                overrides=overrides,
+                interpolate=False,
+            )
+            nlp = init_nlp(config)
 
-        # Clean up the temporary files and directories
-        os.remove(tmp_cfg_path)
-        shutil.rmtree(tmp_model_path)
+        # Train into a temporary directory next to the final one
+        new_model_path = output_path or os.path.join(LOCAL_MODEL_DIR, name)
+        os.makedirs(new_model_path, exist_ok=True)
+        tmp_model_path = new_model_path.rstrip(os.sep) + "-training"
+        os.makedirs(tmp_model_path, exist_ok=True)
+        try:
+            with threadpool_limits(limits=n_threads):
+                train_nlp(nlp, ensure_path(tmp_model_path))
+
+            # Move the best pipeline to the model directory
+            self._move_files(
+                os.path.join(tmp_model_path, "model-best"), new_model_path
+            )
+        finally:
+            # Clean up the temporary directory
+            shutil.rmtree(tmp_model_path, ignore_errors=True)
+
+        # Load the trained pipeline with the loading options of the agent,
+        # into the vocab of the other pipeline only if it still uses the
+        # shared one
+        other = self._models.get(
+            "entity_recognizer" if declutter_model else "declutter_model"
+        )
+        with self._load_lock:
+            if other is None or other.vocab is not self._vocab:
+                self._vocab = None
+            nlp = self._load_spacy_model(new_model_path)
+
+        # Swap the trained pipeline into the agent and drop the cached results
+        # of the previous one
+        with self._lock.write():
+            setattr(self, f"{name}_path", new_model_path)
+            setattr(self, name, nlp)
+            self._shared_tokenizer = None
+            self._update_fingerprints()
 
     def _move_files(self, src_dir, dst_dir):
         """
@@ -350,6 +2065,12 @@ class SafaaAgent:
             # Construct full paths for source and destination
             src_item_path = os.path.join(src_dir, item)
             dst_item_path = os.path.join(dst_dir, item)
+            # Remove the item it replaces, which shutil.move would otherwise
+            # move the source item into
+            if os.path.isdir(dst_item_path):
+                shutil.rmtree(dst_item_path)
+            elif os.path.exists(dst_item_path):
+                os.remove(dst_item_path)
             # Move each item from the source directory to the destination
             # directory
             shutil.move(src_item_path, dst_item_path)
@@ -373,13 +2094,24 @@ class SafaaAgent:
         os.makedirs(save_path, exist_ok=True)
 
         # Check directory permissions
-        if not os.access(path, os.W_OK):
+        if not os.access(save_path, os.W_OK):
             print(
                 "Write permissions are not granted for the directory: "
                 f"{save_path}"
             )
             return
 
+        self._write_models(save_path)
+
+    def _write_models(self, save_path):
+        """
+        Writes the scikit-learn models, and the compact artifacts if the
+        directory holds some, without changing the models the agent uses.
+
+        Parameters:
+        save_path (str): The existing directory to write to.
+        """
+
         # Construct the full paths for the model and vectorizer files
         false_positive_detector_path = os.path.join(
             save_path, "false_positive_detection_model_sgd.pkl"
@@ -388,7 +2120,27 @@ class SafaaAgent:
             save_path, "false_positive_detection_vectorizer.pkl"
         )
 
-        # Save the false positive detector model and vectorizer to the specified
-        # paths
-        dump(self.false_positive_detector, false_positive_detector_path)
-        dump(self.vectorizer, vectorizer_path)
+        # Save the scikit-learn models rather than the compact ones, replacing
+        # the files atomically so that concurrent readers never load a
+        # half-written model
+        with self._lock.read():
+            if self.compact:
+                # The compact models are never trained, so their pickles are
+                # loaded aside to keep the agent on the memory-mapped ones
+                from joblib import load
+
+                detector = load(self.false_positive_detector_path)
+                vectorizer = load(self.vectorizer_path)
+            else:
+                detector = self.false_positive_detector
+                vectorizer = self.vectorizer
+            _dump_atomic(detector, false_positive_detector_path)
+            _dump_atomic(vectorizer, vectorizer_path)
+
+            # Refresh the compact artifacts of the directory so that they
+            # match the saved models
+            compact_path = os.path.join(save_path, COMPACT_MODEL_DIR)
+            if os.path.isdir(compact_path):
+                from .artifacts import export_compact
+
+                export_compact(vectorizer, detector, compact_path)
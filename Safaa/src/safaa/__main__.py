@@ -0,0 +1,7 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+from .cli import main
+
+main()
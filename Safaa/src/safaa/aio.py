@@ -0,0 +1,265 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+"""
+AsyncSafaaAgent: awaitable predict and declutter calls for asyncio services.
+
+The CPU-bound agent calls run in an executor, so the event loop stays
+responsive, and the requests of concurrent callers are coalesced into shared
+batches.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from .Safaa import SafaaAgent
+from .server import DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT
+
+# Constants
+DEFAULT_MAX_QUEUE_SIZE = 1000
+
+
+class _Request:
+    """
+    A request waiting in the queue of the async agent.
+    """
+
+    def __init__(self, op, data, future, predictions=None, threshold=0.5):
+        self.op = op
+        self.data = data
+        self.future = future
+        self.predictions = predictions
+        self.threshold = threshold
+
+    @property
+    def group(self):
+        """
+        The requests of a group can be answered by a single agent call.
+        """
+        return (self.op, self.threshold if self.op == "predict" else None)
+
+
+class AsyncSafaaAgent:
+    def __init__(
+        self,
+        agent=None,
+        executor=None,
+        max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+        max_wait=DEFAULT_MAX_WAIT,
+        max_queue_size=DEFAULT_MAX_QUEUE_SIZE,
+        **kwargs,
+    ):
+        """
+        Initializes the async agent, which answers awaiting callers from a
+        background task running the agent calls in an executor.
+
+        Parameters:
+        agent (SafaaAgent): The agent answering the requests. Defaults to None,
+                            creating one from the remaining keyword arguments.
+        executor (Executor): The executor running the agent calls. Defaults
+                             to None, using a single thread owned by the async
+                             agent.
+        max_batch_size (int): Number of strings after which a batch is run
+                              without waiting for more requests. Defaults to
+                              DEFAULT_MAX_BATCH_SIZE.
+        max_wait (float): Seconds to wait for more requests after the first
+                          one of a batch. Defaults to DEFAULT_MAX_WAIT.
+        max_queue_size (int): Number of requests queued before callers wait
+                              for room. Defaults to DEFAULT_MAX_QUEUE_SIZE.
+        """
+
+        self.agent = agent if agent is not None else SafaaAgent(**kwargs)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_queue_size = max_queue_size
+        self.batches = 0
+        self.requests = 0
+
+        # The agent calls mostly hold the GIL, so the default executor runs
+        # one call at a time and lets the batches grow meanwhile. A wider
+        # executor can share the agent, whose calls are thread-safe
+        self._own_executor = executor is None
+        self._executor = (
+            executor
+            if executor is not None
+            else ThreadPoolExecutor(max_workers=1, thread_name_prefix="safaa")
+        )
+
+        # The queue and the batching task belong to the running event loop,
+        # so they are created on first use
+        self._queue = None
+        self._loop = None
+        self._task = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    def _start(self):
+        """
+        Creates the queue and starts the batching task, if not running.
+        A task that died is restarted on the same queue.
+        """
+
+        if self._task is None or self._task.done():
+            # Keep the requests still queued for the new task, unless the
+            # queue belongs to an event loop that is no longer running
+            loop = asyncio.get_running_loop()
+            if self._queue is None or self._loop is not loop:
+                self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+                self._loop = loop
+            self._task = loop.create_task(self._run())
+
+    async def _submit(self, op, data, predictions=None, threshold=0.5):
+        """
+        Queues a request, waiting for room in the queue, and awaits its
+        result.
+        """
+
+        if not data:
+            return []
+        self._start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(
+            _Request(op, data, future, predictions, threshold)
+        )
+        # Cancelling the caller cancels the future, so the request is dropped
+        # from its batch if that has not started yet
+        return await future
+
+    async def apredict(self, data, threshold=0.5):
+        """
+        Predicts false positives without blocking the event loop.
+
+        Parameters:
+        data (iterable): The strings to predict.
+        threshold (float): The probability threshold for classifying as a
+                           false positive. Defaults to 0.5.
+
+        Returns:
+        list: Predictions for each input string.
+        """
+
+        data = self.agent._ensure_list_of_strings(data)
+        return await self._submit("predict", data, threshold=threshold)
+
+    async def adeclutter(self, data, predictions):
+        """
+        Declutters copyright notices without blocking the event loop.
+
+        Parameters:
+        data (iterable): The strings to declutter.
+        predictions (list): Predictions for each input string.
+
+        Returns:
+        list: Decluttered strings.
+        """
+
+        data = self.agent._ensure_list_of_strings(data)
+        predictions = list(predictions)
+        if len(data) != len(predictions):
+            raise ValueError("data and predictions differ in length")
+        return await self._submit("declutter", data, predictions=predictions)
+
+    async def _run(self):
+        """
+        Collects the queued requests into batches and answers them.
+        """
+
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wait for a first request, then for more until the batch is full
+            # or the waiting time is over
+            batch = [await self._queue.get()]
+            size = len(batch[0].data)
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    request = await asyncio.wait_for(
+                        self._queue.get(), timeout
+                    )
+                except asyncio.TimeoutError:
+                    break
+                batch.append(request)
+                size += len(request.data)
+
+            # Drop the requests whose callers were cancelled meanwhile
+            batch = [
+                request for request in batch if not request.future.done()
+            ]
+
+            # Answer each group of compatible requests with one agent call
+            groups = {}
+            for request in batch:
+                groups.setdefault(request.group, []).append(request)
+            for requests in groups.values():
+                await self._answer(requests)
+            if batch:
+                self.batches += 1
+                self.requests += len(batch)
+
+    async def _answer(self, requests):
+        """
+        Answers compatible requests with a single agent call in the executor.
+        """
+
+        loop = asyncio.get_running_loop()
+        data = [text for request in requests for text in request.data]
+        try:
+            if requests[0].op == "predict":
+                results = await loop.run_in_executor(
+                    self._executor,
+                    self.agent.predict,
+                    data,
+                    requests[0].threshold,
+                )
+            else:
+                predictions = [
+                    prediction
+                    for request in requests
+                    for prediction in request.predictions
+                ]
+                results = await loop.run_in_executor(
+                    self._executor, self.agent.declutter, data, predictions
+                )
+        except asyncio.CancelledError:
+            for request in requests:
+                request.future.cancel()
+            raise
+        except Exception as error:
+            for request in requests:
+                if not request.future.done():
+                    request.future.set_exception(error)
+            return
+
+        # Split the results back between the requests still awaited
+        start = 0
+        for request in requests:
+            end = start + len(request.data)
+            if not request.future.done():
+                request.future.set_result(results[start:end])
+            start = end
+
+    async def aclose(self):
+        """
+        Stops the batching task, cancelling the requests still queued, and
+        shuts down the executor if the async agent created it.
+        """
+
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            while not self._queue.empty():
+                self._queue.get_nowait().future.cancel()
+        if self._own_executor:
+            self._executor.shutdown(wait=False)
@@ -0,0 +1,395 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+"""
+Compact model artifacts: the vectorizer and the false positive detector
+stored as NumPy arrays, memory-mapped on load instead of unpickled.
+
+An artifact directory holds:
+
+    manifest.json   the vectorizer options and the classifier intercept,
+                    classes and loss
+    vocabulary.npy  the vocabulary terms, UTF-8 encoded and sorted
+    columns.npy     the feature column of each sorted term
+    idf.npy         the inverse document frequency of each column, if the
+                    vectorizer applies idf weighting
+    coef.npy        the classifier coefficient of each column
+
+The arrays are loaded with mmap_mode="r", so processes loading the same
+artifacts share their pages instead of each holding a private copy.
+"""
+
+import json
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+from .Safaa import COMPACT_MODEL_DIR
+
+# Constants
+FORMAT_VERSION = 1
+PROBABILISTIC_LOSSES = ("log_loss", "log", "modified_huber")
+
+
+class CompactVectorizer:
+    def __init__(self, vocabulary, columns, idf, options):
+        """
+        Initializes a vectorizer producing the same matrices as the
+        TfidfVectorizer it was exported from.
+
+        Parameters:
+        vocabulary (ndarray): The sorted UTF-8 encoded vocabulary terms.
+        columns (ndarray): The feature column of each sorted term.
+        idf (ndarray): The idf of each column, or None to skip idf weighting.
+        options (dict): The lowercase, token_pattern, ngram_range, binary,
+                        sublinear_tf and norm options of the vectorizer.
+        """
+
+        self.vocabulary = vocabulary
+        self.columns = columns
+        self.idf = idf
+        self.lowercase = options["lowercase"]
+        self.token_pattern = re.compile(options["token_pattern"])
+        self.ngram_range = tuple(options["ngram_range"])
+        self.binary = options["binary"]
+        self.sublinear_tf = options["sublinear_tf"]
+        self.norm = options["norm"]
+        self.n_features = len(columns)
+
+    def _analyze(self, document):
+        """
+        Splits a document into its word n-grams like the scikit-learn word
+        analyzer.
+        """
+
+        if self.lowercase:
+            document = document.lower()
+        tokens = self.token_pattern.findall(document)
+        min_n, max_n = self.ngram_range
+        if max_n == 1:
+            return tokens
+        ngrams = list(tokens) if min_n == 1 else []
+        for n in range(max(min_n, 2), min(max_n, len(tokens)) + 1):
+            for start in range(len(tokens) - n + 1):
+                ngrams.append(" ".join(tokens[start:start + n]))
+        return ngrams
+
+    def _lookup(self, terms):
+        """
+        Finds the feature columns of the terms with a binary search of the
+        sorted vocabulary.
+
+        Returns:
+        tuple: A mask of the terms in the vocabulary, and their columns.
+        """
+
+        if not terms:
+            return np.zeros(0, dtype=bool), np.zeros(0, dtype=np.int64)
+        terms = np.array([term.encode("utf-8") for term in terms])
+        positions = np.searchsorted(self.vocabulary, terms)
+        positions = np.minimum(positions, len(self.vocabulary) - 1)
+        found = self.vocabulary[positions] == terms
+        return found, self.columns[positions[found]]
+
+    def transform(self, raw_documents):
+        """
+        Transforms documents to a document-term matrix.
+
+        Parameters:
+        raw_documents (iterable): The strings to vectorize.
+
+        Returns:
+        csr_matrix: The tf-idf weighted document-term matrix.
+        """
+
+        from scipy.sparse import csr_matrix
+
+        if isinstance(raw_documents, str):
+            raise ValueError(
+                "Iterable over raw text documents expected, string object "
+                "received."
+            )
+
+        # Count the terms of each document
+        terms, counts, lengths = [], [], []
+        for document in raw_documents:
+            document_terms = Counter(self._analyze(document))
+            terms.extend(document_terms)
+            counts.extend(document_terms.values())
+            lengths.append(len(document_terms))
+
+        # Keep the terms of the vocabulary
+        found, columns = self._lookup(terms)
+        rows = np.repeat(np.arange(len(lengths)), lengths)[found]
+        if self.binary:
+            data = np.ones(len(columns))
+        else:
+            data = np.asarray(counts, dtype=np.float64)[found]
+            if self.sublinear_tf:
+                data = np.log(data) + 1.0
+        if self.idf is not None:
+            data *= self.idf[columns]
+        if self.norm == "l2":
+            norms = np.sqrt(
+                np.bincount(rows, data * data, minlength=len(lengths))
+            )
+            data /= norms[rows]
+
+        matrix = csr_matrix(
+            (data, (rows, columns)), shape=(len(lengths), self.n_features)
+        )
+        matrix.sort_indices()
+        return matrix
+
+
+class CompactClassifier:
+    def __init__(self, coef, intercept, classes, loss):
+        """
+        Initializes a binary linear classifier making the same predictions as
+        the SGDClassifier it was exported from.
+
+        Parameters:
+        coef (ndarray): The coefficient of each feature column.
+        intercept (float): The intercept.
+        classes (ndarray): The negative and positive class labels.
+        loss (str): The loss the classifier was trained with.
+        """
+
+        self.coef = coef
+        self.intercept = intercept
+        self.classes_ = classes
+        self.loss = loss
+
+    def decision_function(self, X):
+        """
+        Returns the signed distance of each row of X to the hyperplane.
+        """
+
+        return X @ self.coef + self.intercept
+
+    def predict(self, X):
+        """
+        Returns the predicted class label of each row of X.
+        """
+
+        return self.classes_[(self.decision_function(X) > 0).astype(int)]
+
+
+class CompactProbabilisticClassifier(CompactClassifier):
+    def predict_proba(self, X):
+        """
+        Returns the probability of each class for each row of X, like
+        SGDClassifier for the log and modified Huber losses.
+        """
+
+        scores = self.decision_function(X)
+        if self.loss == "modified_huber":
+            positive = (np.clip(scores, -1, 1) + 1) / 2
+        else:
+            positive = 1 / (1 + np.exp(-scores))
+        return np.column_stack([1 - positive, positive])
+
+
+def _vectorizer_options(vectorizer):
+    """
+    Returns the options of a TfidfVectorizer, or raises a ValueError if the
+    compact vectorizer cannot reproduce it.
+    """
+
+    params = vectorizer.get_params()
+    unsupported = {
+        "analyzer": "word",
+        "input": "content",
+        "preprocessor": None,
+        "tokenizer": None,
+        "stop_words": None,
+        "strip_accents": None,
+    }
+    for name, value in unsupported.items():
+        if params.get(name) != value:
+            raise ValueError(
+                f"Vectorizers with {name}={params.get(name)!r} cannot be "
+                "exported"
+            )
+    if params.get("norm") not in ("l2", None):
+        raise ValueError(f"Unsupported norm: {params.get('norm')!r}")
+    if re.compile(params["token_pattern"]).groups > 1:
+        raise ValueError("Token patterns with several groups are unsupported")
+    return {
+        "lowercase": params["lowercase"],
+        "token_pattern": params["token_pattern"],
+        "ngram_range": list(params["ngram_range"]),
+        "binary": params["binary"],
+        "sublinear_tf": params.get("sublinear_tf", False),
+        "norm": params.get("norm"),
+    }
+
+
+def export_compact(vectorizer, classifier, path):
+    """
+    Writes a fitted TfidfVectorizer and binary linear classifier as compact
+    artifacts.
+
+    Parameters:
+    vectorizer (TfidfVectorizer): The fitted vectorizer.
+    classifier (SGDClassifier): The fitted binary classifier.
+    path (str): The artifact directory to write.
+    """
+
+    options = _vectorizer_options(vectorizer)
+    if classifier.coef_.shape[0] != 1:
+        raise ValueError("Only binary classifiers can be exported")
+
+    # Sort the vocabulary so that terms can be found by binary search
+    terms = sorted(vectorizer.vocabulary_)
+    vocabulary = np.array([term.encode("utf-8") for term in terms])
+    columns = np.array(
+        [vectorizer.vocabulary_[term] for term in terms], dtype=np.int64
+    )
+
+    # The vectorizer only applies idf weighting when it exposes idf_, which
+    # vectorizers pickled by older scikit-learn versions do not
+    try:
+        idf = np.asarray(vectorizer.idf_, dtype=np.float64)
+    except AttributeError:
+        idf = None
+
+    arrays = {
+        "vocabulary.npy": vocabulary,
+        "columns.npy": columns,
+        "coef.npy": np.ascontiguousarray(
+            classifier.coef_[0], dtype=np.float64
+        ),
+    }
+    if idf is not None:
+        arrays["idf.npy"] = idf
+    manifest = {
+        "format": FORMAT_VERSION,
+        "vectorizer": dict(options, idf=idf is not None),
+        "classifier": {
+            "intercept": float(classifier.intercept_[0]),
+            "classes": classifier.classes_.tolist(),
+            "loss": classifier.get_params().get("loss"),
+        },
+    }
+
+    # Write every file under a temporary name first, then rename them over
+    # the previous artifacts, so that agents memory-mapping those keep their
+    # pages instead of seeing the files truncated
+    os.makedirs(path, exist_ok=True)
+    suffix = f".{os.getpid()}.tmp"
+    written = []
+    try:
+        for name, array in arrays.items():
+            temporary_path = os.path.join(path, name + suffix)
+            written.append(temporary_path)
+            with open(temporary_path, "wb") as f:
+                np.save(f, array)
+        temporary_path = os.path.join(path, "manifest.json" + suffix)
+        written.append(temporary_path)
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        # Rename the manifest last, so that a complete set of arrays is in
+        # place before it describes them
+        for temporary_path in written:
+            os.replace(temporary_path, temporary_path[: -len(suffix)])
+    finally:
+        for temporary_path in written:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+
+    # Drop the idf of previous artifacts, which the manifest no longer uses
+    if idf is None and os.path.exists(os.path.join(path, "idf.npy")):
+        os.remove(os.path.join(path, "idf.npy"))
+
+
+def convert(model_dir, path=None):
+    """
+    Converts the pickled vectorizer and false positive detector of a model
+    directory to compact artifacts.
+
+    Parameters:
+    model_dir (str): The directory holding the pickled models.
+    path (str): The artifact directory to write. Defaults to the compact
+                directory of the model directory.
+
+    Returns:
+    str: The artifact directory.
+    """
+
+    from joblib import load
+
+    path = path or os.path.join(model_dir, COMPACT_MODEL_DIR)
+    vectorizer = load(
+        os.path.join(model_dir, "false_positive_detection_vectorizer.pkl")
+    )
+    classifier = load(
+        os.path.join(model_dir, "false_positive_detection_model_sgd.pkl")
+    )
+    export_compact(vectorizer, classifier, path)
+    return path
+
+
+def _read_manifest(path):
+    with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported compact artifact format: {manifest.get('format')}"
+        )
+    return manifest
+
+
+def load_compact_vectorizer(path):
+    """
+    Loads the compact vectorizer of an artifact directory, memory-mapping its
+    arrays.
+
+    Parameters:
+    path (str): The artifact directory.
+
+    Returns:
+    CompactVectorizer: The vectorizer.
+    """
+
+    options = _read_manifest(path)["vectorizer"]
+    idf = None
+    if options["idf"]:
+        idf = np.load(os.path.join(path, "idf.npy"), mmap_mode="r")
+    return CompactVectorizer(
+        np.load(os.path.join(path, "vocabulary.npy"), mmap_mode="r"),
+        np.load(os.path.join(path, "columns.npy"), mmap_mode="r"),
+        idf,
+        options,
+    )
+
+
+def load_compact_classifier(path):
+    """
+    Loads the compact classifier of an artifact directory, memory-mapping
+    its coefficients.
+
+    Parameters:
+    path (str): The artifact directory.
+
+    Returns:
+    CompactClassifier: The classifier, with predict_proba if its loss
+                       supports probabilities.
+    """
+
+    options = _read_manifest(path)["classifier"]
+    cls = (
+        CompactProbabilisticClassifier
+        if options["loss"] in PROBABILISTIC_LOSSES
+        else CompactClassifier
+    )
+    return cls(
+        np.load(os.path.join(path, "coef.npy"), mmap_mode="r"),
+        options["intercept"],
+        np.asarray(options["classes"]),
+        options["loss"],
+    )
@@ -0,0 +1,243 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+"""
+ResultCache: content-addressed cache for SafaaAgent results.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# Constants
+DEFAULT_CACHE_SIZE = 100000
+
+
+def fingerprint(*parts):
+    """
+    Hashes the given parts into a short hexadecimal fingerprint.
+
+    Parameters:
+    parts (str or bytes): The values identifying a model state.
+
+    Returns:
+    str: The fingerprint.
+    """
+
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        digest.update(part)
+        # Separate the parts so that ("ab", "c") and ("a", "bc") differ
+        digest.update(b"\0")
+    return digest.hexdigest()[:32]
+
+
+def path_fingerprint(path):
+    """
+    Fingerprints a model file or directory from the names, sizes and
+    modification times of the files it contains.
+
+    Parameters:
+    path (str): The model file or directory.
+
+    Returns:
+    str: The fingerprint.
+    """
+
+    parts = [os.path.abspath(path)]
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                stat = os.stat(file_path)
+                parts.append(
+                    f"{os.path.relpath(file_path, path)}:"
+                    f"{stat.st_size}:{stat.st_mtime_ns}"
+                )
+    elif os.path.exists(path):
+        stat = os.stat(path)
+        parts.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+    return fingerprint(*parts)
+
+
+class ResultCache:
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE, path=None):
+        """
+        Initializes the cache with an in-memory LRU tier and an optional
+        on-disk SQLite tier.
+
+        Parameters:
+        max_size (int): Maximum number of entries kept in memory. Defaults to
+                        DEFAULT_CACHE_SIZE.
+        path (str): Path of the SQLite file backing the on-disk tier. Defaults
+                    to None, keeping the cache in memory only.
+        """
+
+        self.max_size = max_size
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+
+        # Map each key to its (fingerprint, value) pair, least recently used
+        # entries first
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Open the on-disk tier if requested
+        self._connection = None
+        if path:
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, fingerprint TEXT, value TEXT)"
+            )
+            self._connection.commit()
+
+    @staticmethod
+    def make_key(model_fingerprint, namespace, text):
+        """
+        Builds the cache key of an input text.
+
+        Parameters:
+        model_fingerprint (str): Fingerprint of the models producing the
+                                 result.
+        namespace (str): The kind of result, including its options.
+        text (str): The input text.
+
+        Returns:
+        str: The cache key.
+        """
+
+        return fingerprint(model_fingerprint, namespace, text)
+
+    def get_many(self, keys):
+        """
+        Looks up the given keys, first in memory and then on disk.
+
+        Parameters:
+        keys (list): The cache keys to look up.
+
+        Returns:
+        dict: The cached values of the keys that were found.
+        """
+
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                entry = self._memory.get(key)
+                if entry is None:
+                    missing.append(key)
+                    continue
+                self._memory.move_to_end(key)
+                found[key] = entry[1]
+
+            # Look the remaining keys up on disk, promoting them to memory
+            if missing and self._connection is not None:
+                for start in range(0, len(missing), 500):
+                    chunk = missing[start:start + 500]
+                    rows = self._connection.execute(
+                        "SELECT key, fingerprint, value FROM results "
+                        f"WHERE key IN ({','.join('?' * len(chunk))})",
+                        chunk,
+                    )
+                    for key, model_fingerprint, value in rows:
+                        found[key] = value
+                        self._remember(key, model_fingerprint, value)
+
+            # Count every looked up key, including repeated ones
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def set_many(self, values, model_fingerprint):
+        """
+        Stores the given values in memory and on disk.
+
+        Parameters:
+        values (dict): The values to store, by cache key.
+        model_fingerprint (str): Fingerprint of the models that produced the
+                                 values.
+        """
+
+        with self._lock:
+            for key, value in values.items():
+                self._remember(key, model_fingerprint, value)
+            if self._connection is not None:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+                    (
+                        (key, model_fingerprint, value)
+                        for key, value in values.items()
+                    ),
+                )
+                self._connection.commit()
+
+    def _remember(self, key, model_fingerprint, value):
+        """
+        Stores a value in the memory tier, evicting the least recently used
+        entries when full.
+        """
+
+        self._memory[key] = (model_fingerprint, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def invalidate(self, keep_fingerprints=()):
+        """
+        Removes the entries produced by models other than the given ones.
+
+        Parameters:
+        keep_fingerprints (iterable): Fingerprints of the models whose entries
+                                      are kept. Defaults to none.
+        """
+
+        keep_fingerprints = set(keep_fingerprints)
+        with self._lock:
+            self._memory = OrderedDict(
+                (key, entry)
+                for key, entry in self._memory.items()
+                if entry[0] in keep_fingerprints
+            )
+            if self._connection is not None:
+                self._connection.execute(
+                    "DELETE FROM results WHERE fingerprint NOT IN "
+                    f"({','.join('?' * len(keep_fingerprints))})",
+                    list(keep_fingerprints),
+                )
+                self._connection.commit()
+
+    def stats(self):
+        """
+        Returns the hit/miss counters of the cache.
+
+        Returns:
+        dict: The hits, misses, hit rate and number of entries in memory.
+        """
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._memory),
+            }
+
+    def close(self):
+        """
+        Closes the on-disk tier.
+        """
+
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,351 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+"""
+Command line entry point of the safaa package.
+"""
+
+import csv
+import json
+import math
+import sys
+from argparse import ArgumentParser
+
+from .cache import DEFAULT_CACHE_SIZE, ResultCache
+from .parallel import ParallelSafaaAgent
+from .prefilter import RULE_SETS, Prefilter
+from .registry import ModelRegistry
+from .Safaa import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_WATCH_INTERVAL,
+    SafaaAgent,
+)
+from .server import DEFAULT_MAX_WAIT, SafaaServer
+
+# The input formats, by file extension
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".json": "jsonl"}
+
+
+def build_agent(args):
+    """
+    Creates the agent described by the common command line options.
+    """
+
+    cache = None
+    if args.cache_size or args.cache_path:
+        cache = ResultCache(
+            max_size=args.cache_size or DEFAULT_CACHE_SIZE,
+            path=args.cache_path,
+        )
+    options = {
+        "model_dir": args.model_dir,
+        "batch_size": args.batch_size,
+        "cache": cache,
+        "prefilter": Prefilter(args.prefilter) if args.prefilter else None,
+    }
+    if args.workers and args.workers > 1:
+        # Split each scored chunk, or each server batch, between all the
+        # workers, since inputs no larger than a worker chunk run in-process
+        calls = getattr(args, "chunk_size", args.batch_size)
+        return ParallelSafaaAgent(
+            workers=args.workers,
+            chunk_size=max(1, math.ceil(calls / args.workers)),
+            **options,
+        )
+    return SafaaAgent(**options)
+
+
+def read_records(input_file, input_format):
+    """
+    Lazily reads the input records as dictionaries.
+
+    Parameters:
+    input_file (file): The opened input.
+    input_format (str): One of "csv", "jsonl" or "lines".
+
+    Returns:
+    iterator: The records.
+    """
+
+    if input_format == "csv":
+        yield from csv.DictReader(input_file)
+    elif input_format == "jsonl":
+        for line in input_file:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        for line in input_file:
+            yield {"text": line.rstrip("\r\n")}
+
+
+def score_records(agent, records, args):
+    """
+    Lazily adds the prediction and/or the decluttered text to each record,
+    one chunk at a time.
+
+    Parameters:
+    agent (SafaaAgent): The agent scoring the records.
+    records (iterable): The input records.
+    args (Namespace): The command line options.
+
+    Returns:
+    iterator: The scored records, in input order.
+    """
+
+    for chunk in agent._iter_chunks(records, args.chunk_size):
+        texts = [str(record.get(args.text_field, "")) for record in chunk]
+        if args.mode == "predict":
+            predictions = agent.predict(texts, args.threshold)
+            decluttered = None
+        elif args.mode == "declutter" and all(
+            record.get(args.prediction_field) for record in chunk
+        ):
+            # Reuse the predictions already present in the records
+            predictions = None
+            decluttered = agent.declutter(
+                texts, [record[args.prediction_field] for record in chunk]
+            )
+        else:
+            predictions, decluttered = zip(
+                *agent.process(texts, args.threshold)
+            )
+            if args.mode == "declutter":
+                predictions = None
+
+        for i, record in enumerate(chunk):
+            if predictions is not None:
+                record[args.prediction_field] = predictions[i]
+            if decluttered is not None:
+                record[args.declutter_field] = decluttered[i]
+            yield record
+
+
+def write_records(records, output_file, output_format):
+    """
+    Writes the scored records as they are produced.
+
+    Parameters:
+    records (iterable): The scored records.
+    output_file (file): The opened output.
+    output_format (str): Either "csv" or "jsonl".
+    """
+
+    writer = None
+    for record in records:
+        if output_format == "csv":
+            if writer is None:
+                writer = csv.DictWriter(output_file, fieldnames=list(record))
+                writer.writeheader()
+            writer.writerow(record)
+        else:
+            output_file.write(json.dumps(record) + "\n")
+
+
+def score(args):
+    """
+    Scores a CSV, JSONL or newline-delimited input in streaming chunks.
+    """
+
+    input_format = args.format
+    if input_format is None:
+        extension = "." + args.input.rsplit(".", 1)[-1].lower()
+        input_format = FORMATS.get(extension, "lines")
+    if args.text_field is None:
+        args.text_field = "copyright" if input_format == "csv" else "text"
+    output_format = "csv" if input_format == "csv" else "jsonl"
+
+    agent = build_agent(args)
+    input_file = (
+        sys.stdin
+        if args.input == "-"
+        else open(args.input, "r", encoding="utf-8", newline="")
+    )
+    output_file = (
+        sys.stdout
+        if args.output == "-"
+        else open(args.output, "w", encoding="utf-8", newline="")
+    )
+    try:
+        records = score_records(
+            agent, read_records(input_file, input_format), args
+        )
+        write_records(records, output_file, output_format)
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+        if isinstance(agent, ParallelSafaaAgent):
+            agent.close()
+
+
+def serve(args):
+    """
+    Keeps one agent resident and answers requests until interrupted.
+    """
+
+    # Serve the current version of the registry, if given, and adopt the
+    # versions published later
+    registry = None
+    if args.registry:
+        registry = ModelRegistry(args.registry)
+        args.model_dir = registry.version_path()
+
+    agent = build_agent(args)
+    # Load every model before accepting requests
+    agent._load_models(eager=True)
+    if registry is not None:
+        agent.watch(registry, args.watch_interval)
+    server = SafaaServer(
+        agent,
+        socket_path=args.socket,
+        host=args.host,
+        port=args.port,
+        max_batch_size=args.batch_size,
+        max_wait=args.max_wait_ms / 1000,
+    )
+    print(f"Safaa server listening on {server.address}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def convert(args):
+    """
+    Converts the pickled models to compact artifacts.
+    """
+
+    from .artifacts import convert as convert_models
+
+    # Resolve the model directory the agent would use
+    model_dir = SafaaAgent(model_dir=args.model_dir, compact=False).model_dir
+    print(convert_models(model_dir, args.output))
+
+
+def publish(args):
+    """
+    Publishes a model directory as a new version of a model registry.
+    """
+
+    registry = ModelRegistry(args.registry)
+    model_dir = SafaaAgent(model_dir=args.model_dir).model_dir
+    print(registry.publish(model_dir, activate=not args.no_activate))
+
+
+def main(argv=None):
+    parser = ArgumentParser(prog="safaa", description="Safaa copyright "
+                                                      "false positive "
+                                                      "detection")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser(
+        "serve", help="Keep the models loaded and answer requests over a "
+                      "local socket")
+    serve_parser.add_argument("--socket",
+                              help="Path of the Unix domain socket to "
+                                   "listen on")
+    serve_parser.add_argument("--host", default="127.0.0.1",
+                              help="Host to listen on with --port")
+    serve_parser.add_argument("--port", type=int,
+                              help="TCP port to listen on instead of a "
+                                   "Unix domain socket")
+    serve_parser.add_argument("--max-wait-ms", type=float,
+                              default=DEFAULT_MAX_WAIT * 1000,
+                              help="Milliseconds to wait for concurrent "
+                                   "requests to batch together")
+    serve_parser.add_argument("--registry",
+                              help="Serve the current version of this model "
+                                   "registry and adopt new versions")
+    serve_parser.add_argument("--watch-interval", type=float,
+                              default=DEFAULT_WATCH_INTERVAL,
+                              help="Seconds between checks of the registry")
+    serve_parser.set_defaults(function=serve)
+
+    score_parser = subparsers.add_parser(
+        "score", help="Predict and/or declutter a CSV, JSONL or "
+                      "newline-delimited input in streaming chunks")
+    score_parser.add_argument("input", nargs="?", default="-",
+                              help="Input file, or - for stdin (default)")
+    score_parser.add_argument("-o", "--output", default="-",
+                              help="Output file, or - for stdout (default)")
+    score_parser.add_argument("--format", choices=["csv", "jsonl", "lines"],
+                              help="Input format, guessed from the input "
+                                   "extension by default. CSV input is "
+                                   "written as CSV, other input as JSONL")
+    score_parser.add_argument("--mode", default="both",
+                              choices=["predict", "declutter", "both"])
+    score_parser.add_argument("--text-field",
+                              help="Column or field holding the text, "
+                                   "'copyright' for CSV and 'text' "
+                                   "otherwise")
+    score_parser.add_argument("--prediction-field", default="prediction",
+                              help="Column or field to write the "
+                                   "prediction to, or to read it from in "
+                                   "declutter mode")
+    score_parser.add_argument("--declutter-field", default="decluttered",
+                              help="Column or field to write the "
+                                   "decluttered text to")
+    score_parser.add_argument("--threshold", type=float, default=0.5)
+    score_parser.add_argument("--chunk-size", type=int,
+                              default=DEFAULT_CHUNK_SIZE,
+                              help="Number of records held in memory and "
+                                   "scored at once")
+    score_parser.set_defaults(function=score)
+
+    for subparser in subparsers.choices.values():
+        subparser.add_argument("--model-dir",
+                               help="Directory holding the Safaa models")
+        subparser.add_argument("--batch-size", type=int,
+                               default=DEFAULT_BATCH_SIZE)
+        subparser.add_argument("--workers", type=int, default=1,
+                               help="Number of worker processes")
+        subparser.add_argument("--cache-size", type=int,
+                               help="Cache up to this many results in "
+                                    "memory")
+        subparser.add_argument("--cache-path",
+                               help="SQLite file to persist cached "
+                                    "results in")
+        subparser.add_argument("--prefilter", choices=sorted(RULE_SETS),
+                               help="Label obvious strings with these rules "
+                                    "before running the models")
+
+    convert_parser = subparsers.add_parser(
+        "convert", help="Convert the pickled vectorizer and false positive "
+                        "detector to memory-mapped compact artifacts")
+    convert_parser.add_argument("--model-dir",
+                                help="Directory holding the pickled models")
+    convert_parser.add_argument("-o", "--output",
+                                help="Directory to write the artifacts to, "
+                                     "the compact directory of the model "
+                                     "directory by default")
+    convert_parser.set_defaults(function=convert)
+
+    publish_parser = subparsers.add_parser(
+        "publish", help="Publish a model directory as a new version of a "
+                        "model registry")
+    publish_parser.add_argument("--model-dir",
+                                help="Directory holding the models")
+    publish_parser.add_argument("--registry", required=True,
+                                help="Directory of the model registry")
+    publish_parser.add_argument("--no-activate", action="store_true",
+                                help="Publish without making the version "
+                                     "current")
+    publish_parser.set_defaults(function=publish)
+
+    args = parser.parse_args(argv)
+    if args.command == "serve" and not (args.socket or args.port):
+        parser.error("serve requires --socket or --port")
+    if (
+        args.command == "serve"
+        and args.registry
+        and ModelRegistry(args.registry).current() is None
+    ):
+        parser.error(f"no model version published in {args.registry}")
+    args.function(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+"""
+SafaaClient: a thin client for a running SafaaServer.
+"""
+
+import json
+import socket
+
+
+class SafaaClient:
+    def __init__(self, socket_path=None, host="127.0.0.1", port=None):
+        """
+        Connects to a SafaaServer over a Unix domain socket or a local TCP
+        port.
+
+        Parameters:
+        socket_path (str): Path of the server Unix domain socket. Defaults to
+                           None.
+        host (str): Host of the server when no socket path is given. Defaults
+                    to "127.0.0.1".
+        port (int): TCP port of the server when no socket path is given.
+                    Defaults to None.
+        """
+
+        if socket_path is not None:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(socket_path)
+        elif port is not None:
+            self._socket = socket.create_connection((host, port))
+        else:
+            raise ValueError("Either a socket path or a port is required")
+        self._file = self._socket.makefile("rwb")
+
+    def _request(self, request):
+        """
+        Sends a request and returns the result of its response.
+        """
+
+        self._file.write(json.dumps(request).encode("utf-8") + b"\n")
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("The Safaa server closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["result"]
+
+    def predict(self, data, threshold=0.5):
+        """
+        Predicts false positives in the given data, see SafaaAgent.predict.
+
+        Parameters:
+        data (iterable): The data to predict.
+        threshold (float): The probability threshold for classification.
+                           Defaults to 0.5.
+
+        Returns:
+        list: The predictions.
+        """
+
+        return self._request(
+            {"op": "predict", "data": [str(item) for item in data],
+             "threshold": threshold}
+        )
+
+    def declutter(self, data, predictions):
+        """
+        Cleans up copyright notices, see SafaaAgent.declutter.
+
+        Parameters:
+        data (iterable): The data to declutter.
+        predictions (list): The predictions indicating false positives.
+
+        Returns:
+        list: The decluttered data.
+        """
+
+        return self._request(
+            {"op": "declutter", "data": [str(item) for item in data],
+             "predictions": list(predictions)}
+        )
+
+    def stats(self):
+        """
+        Returns the request, batch and cache counters of the server.
+        """
+
+        return self._request({"op": "stats"})
+
+    def ping(self):
+        """
+        Checks that the server answers.
+        """
+
+        return self._request({"op": "ping"}) == "pong"
+
+    def close(self):
+        """
+        Closes the connection.
+        """
+
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
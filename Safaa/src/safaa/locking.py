@@ -0,0 +1,208 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+"""
+Locks letting many threads share one agent.
+
+Inference only reads the models, so any number of threads run it at once
+under the read side of a ReadWriteLock, while training and model swaps take
+the write side and run alone. spaCy memory zones free the strings of a whole
+vocab on exit and must not be nested, so MemoryZones shares one zone between
+the concurrent calls of a pipeline and closes it when the last one leaves.
+"""
+
+import threading
+from contextlib import contextmanager
+
+# Constants
+DEFAULT_MAX_ZONE_ENTRIES = 64
+
+
+class ReadWriteLock:
+    """
+    A lock held by any number of readers or by a single writer.
+
+    Waiting writers go first, so that a steady flow of readers does not
+    starve them. Both sides are reentrant, and the writer may also read, but
+    a reader cannot become the writer.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writer_depth = 0
+        self._writers_waiting = 0
+        self._local = threading.local()
+
+    @contextmanager
+    def read(self):
+        """
+        Holds the read side of the lock.
+        """
+
+        depth = getattr(self._local, "depth", 0)
+        if depth or self._writer == threading.get_ident():
+            # The thread already holds the lock
+            self._local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._local.depth = depth
+            return
+
+        with self._condition:
+            while self._writer is not None or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
+        self._local.depth = 1
+        try:
+            yield
+        finally:
+            self._local.depth = 0
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        """
+        Holds the write side of the lock.
+
+        Raises:
+        RuntimeError: If the thread holds the read side.
+        """
+
+        ident = threading.get_ident()
+        with self._condition:
+            if self._writer != ident:
+                if getattr(self._local, "depth", 0):
+                    raise RuntimeError(
+                        "Cannot train or swap models during an inference "
+                        "call of the same thread"
+                    )
+                self._writers_waiting += 1
+                try:
+                    while self._writer is not None or self._readers:
+                        self._condition.wait()
+                finally:
+                    self._writers_waiting -= 1
+                self._writer = ident
+            self._writer_depth += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer_depth -= 1
+                if not self._writer_depth:
+                    self._writer = None
+                    self._condition.notify_all()
+
+
+class _Zone:
+    """
+    The state of the memory zone of a vocab.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.context = None
+        self.users = 0
+        self.entries = 0
+        self.waiting = 0
+
+
+class MemoryZones:
+    def __init__(self, max_entries=DEFAULT_MAX_ZONE_ENTRIES):
+        """
+        Initializes the memory zones shared by the concurrent calls of each
+        spaCy vocab.
+
+        Parameters:
+        max_entries (int): Number of calls after which a zone stops admitting
+                           new ones until it closes, so that its strings are
+                           freed even under a steady load. Defaults to
+                           DEFAULT_MAX_ZONE_ENTRIES.
+        """
+
+        self.max_entries = max_entries
+        self._condition = threading.Condition(threading.Lock())
+        self._zones = {}
+
+    @contextmanager
+    def _hold(self, vocab, model):
+        """
+        Holds the zone of a vocab for a pipeline, opening it if needed, or
+        for exclusive use without a zone when the pipeline is None.
+        """
+
+        key = id(vocab)
+        with self._condition:
+            # Join the open zone of the same pipeline unless it is full or
+            # another caller waits for it to close
+            while True:
+                zone = self._zones.get(key)
+                if zone is None:
+                    zone = _Zone(model)
+                    if model is not None:
+                        context = model.memory_zone()
+                        context.__enter__()
+                        zone.context = context
+                    self._zones[key] = zone
+                    break
+                if (
+                    model is not None
+                    and zone.model is model
+                    and zone.entries < self.max_entries
+                    and not zone.waiting
+                ):
+                    break
+                zone.waiting += 1
+                self._condition.wait()
+                zone.waiting -= 1
+            zone.users += 1
+            zone.entries += 1
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                zone.users -= 1
+                if not zone.users:
+                    # The last caller frees the strings of the zone
+                    del self._zones[key]
+                    try:
+                        if zone.context is not None:
+                            zone.context.__exit__(None, None, None)
+                    finally:
+                        self._condition.notify_all()
+
+    def zone(self, model):
+        """
+        Returns a context in which the strings and other resources a spaCy
+        model allocates are freed once no concurrent call uses them anymore.
+
+        Parameters:
+        model (Language): The spaCy pipeline.
+
+        Returns:
+        contextmanager: The shared memory zone.
+        """
+
+        return self._hold(model.vocab, model)
+
+    def exclusive(self, vocab):
+        """
+        Returns a context in which no memory zone of a vocab is open, so that
+        the strings added to it are kept.
+
+        Parameters:
+        vocab (Vocab): The spaCy vocab.
+
+        Returns:
+        contextmanager: The exclusive context.
+        """
+
+        return self._hold(vocab, None)
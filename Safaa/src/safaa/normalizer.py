@@ -0,0 +1,95 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+"""
+TextNormalizer: precompiled text substitutions applied before vectorization.
+"""
+
+import re
+
+# The substitution patterns and their replacements, applied in order. The
+# optional third item lists substrings of which at least one must be present
+# for the pattern to match, letting the regex scan be skipped entirely.
+SUBSTITUTIONS = [
+    (r"\d{4}", " DATE "),
+    (r"\d+", " "),
+    # The three copyright symbol spellings never overlap each other or the
+    # replacement text, so they are matched by a single alternation
+    (r"©|\(c\)|\(C\)", " COPYRIGHTSYMBOL ", ("©", "(c)", "(C)")),
+    (
+        r"""(?:[a-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[a-z0-9!#$%&'*+/=?^_`{|}~-]+)*|"
+                (?:[\x01-\x08\x0b\x0c\x0e-\x1f\x21\x23-\x5b\x5d-\x7f]|
+                \\[\x01-\x09\x0b\x0c\x0e-\x7f])*")@
+                (?:(?:[a-z0-9](?:[a-z0-9-]*[a-z0-9])?\.)+[a-z0-9]
+                (?:[a-z0-9-]*[a-z0-9])?|\[(?:(?:(2(5[0-5]|[0-4][0-9])|
+                1[0-9][0-9]|[1-9]?[0-9]))\.){3}(?:(2(5[0-5]|[0-4][0-9])|
+                1[0-9][0-9]|[1-9]?[0-9])|[a-z0-9-]*[a-z0-9]:(
+                [\x01-\x08\x0b\x0c\x0e-\x1f\x21-\x5a\x53-\x7f]|
+                \\[\x01-\x09\x0b\x0c\x0e-\x7f])+)])""",
+        " EMAIL ",
+        ("@",),
+    ),
+    (r"[^a-zA-Z0-9]", " "),
+]
+
+
+class TextNormalizer:
+    def __init__(self, substitutions=None):
+        """
+        Compiles the substitution patterns once.
+
+        Parameters:
+        substitutions (list): (pattern, replacement[, required]) tuples
+                              applied in order. Defaults to SUBSTITUTIONS.
+        """
+
+        self.substitutions = []
+        for pattern, replacement, *required in substitutions or SUBSTITUTIONS:
+            self.substitutions.append(
+                (
+                    re.compile(pattern).sub,
+                    replacement,
+                    required[0] if required else None,
+                )
+            )
+
+    def normalize(self, sentence):
+        """
+        Applies the whole substitution chain to a single string.
+
+        This includes:
+        - Replacing four-digit numbers (assumed to be years) with ' DATE '.
+        - Removing all other numbers.
+        - Replacing copyright symbols with ' COPYRIGHTSYMBOL '.
+        - Replacing emails with ' EMAIL '.
+        - Removing any special characters not already replaced or removed.
+        - Converting text to lowercase.
+        - Stripping extra whitespace from the text.
+
+        Parameters:
+        sentence (str): The string to normalize.
+
+        Returns:
+        str: The cleaned and standardized string.
+        """
+
+        for substitute, replacement, required in self.substitutions:
+            # Skip the scan when none of the required substrings is present
+            if required and not any(r in sentence for r in required):
+                continue
+            sentence = substitute(replacement, sentence)
+        return sentence.lower().strip()
+
+    def normalize_all(self, data):
+        """
+        Lazily normalizes every string of the data.
+
+        Parameters:
+        data (iterable): The strings to normalize.
+
+        Returns:
+        iterator: The normalized strings, in input order.
+        """
+
+        return map(self.normalize, data)
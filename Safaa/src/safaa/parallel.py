@@ -0,0 +1,272 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+"""
+ParallelSafaaAgent: a SafaaAgent sharding its inference over a process pool.
+"""
+
+import multiprocessing
+
+from .Safaa import (
+    COMPACT_MODELS,
+    DEFAULT_CHUNK_SIZE,
+    MODEL_NAMES,
+    SPACY_MODELS,
+    SafaaAgent,
+)
+
+# The agent of a worker process, inherited from the parent when forked
+_worker_agent = None
+
+
+def _init_worker(agent_options, model_paths=None, trained_models=None):
+    """
+    Creates the agent of a spawned worker process, which cannot inherit the
+    models of the parent, loading the pipelines from the paths the parent
+    uses and adopting the trained models it sends.
+    """
+
+    global _worker_agent
+    if _worker_agent is None:
+        _worker_agent = SafaaAgent(**agent_options)
+        for name, path in (model_paths or {}).items():
+            setattr(_worker_agent, f"{name}_path", path)
+        if trained_models:
+            # The model files do not hold the weights trained by the parent
+            _worker_agent._models.update(trained_models)
+            _worker_agent._detector_trained = True
+        for name in MODEL_NAMES:
+            getattr(_worker_agent, name)
+    else:
+        # The locks of a forked agent may have been held by other threads of
+        # the parent
+        _worker_agent._init_locks()
+
+
+def _predict_chunk(args):
+    chunk, threshold, batch_size = args
+    return SafaaAgent._predict(_worker_agent, chunk, threshold, batch_size, 1)
+
+
+def _scores_chunk(args):
+    chunk, batch_size = args
+    return SafaaAgent._predict_scores(_worker_agent, chunk, batch_size, 1)
+
+
+def _process_chunk(args):
+    chunk, threshold, batch_size = args
+    return SafaaAgent._process(_worker_agent, chunk, threshold, batch_size, 1)
+
+
+def _declutter_chunk(args):
+    chunk, batch_size = args
+    return SafaaAgent._declutter(_worker_agent, chunk, batch_size, 1)
+
+
+class ParallelSafaaAgent(SafaaAgent):
+    def __init__(self, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, **kwargs):
+        """
+        Initializes an agent whose predict and declutter calls are sharded
+        across a pool of worker processes.
+
+        The models are loaded once in the parent before the pool starts, and
+        shared with the workers through fork copy-on-write where the platform
+        allows it. Otherwise each worker loads its own models.
+
+        Parameters:
+        workers (int): Number of worker processes. Defaults to the number of
+                       CPUs.
+        chunk_size (int): Number of strings sent to a worker at once.
+                          Defaults to DEFAULT_CHUNK_SIZE.
+        kwargs: The SafaaAgent options.
+        """
+
+        super().__init__(**kwargs)
+        self.workers = workers or multiprocessing.cpu_count()
+        self.chunk_size = chunk_size
+        self._agent_options = {
+            "model_dir": self.model_dir,
+            "batch_size": self.batch_size,
+            "compact": self.compact,
+            "inference_only": self.inference_only,
+            "share_vocab": self.share_vocab,
+            "prefilter": self.prefilter,
+            "sort_by_length": self.sort_by_length,
+            "max_chars": self.max_chars,
+            "overflow": self.overflow,
+        }
+        self._pool = None
+
+    def _get_pool(self):
+        """
+        Starts the worker pool, after loading the models so that forked
+        workers share them.
+        """
+
+        global _worker_agent
+        if self._pool is None:
+            with self._load_lock:
+                if self._pool is None:
+                    model_paths = trained_models = None
+                    if "fork" in multiprocessing.get_all_start_methods():
+                        for name in MODEL_NAMES:
+                            getattr(self, name)
+                        _worker_agent = self
+                        context = multiprocessing.get_context("fork")
+                    else:
+                        context = multiprocessing.get_context("spawn")
+                        # Point the workers to the pipelines trained since
+                        # the agent was created, outside its model directory
+                        model_paths = {
+                            name: getattr(self, f"{name}_path")
+                            for name in SPACY_MODELS
+                        }
+                        # Send the trained models, which spawned workers
+                        # would otherwise load untrained from the files
+                        if self._detector_trained:
+                            trained_models = {
+                                name: getattr(self, name)
+                                for name in COMPACT_MODELS
+                            }
+                    self._pool = context.Pool(
+                        self.workers,
+                        initializer=_init_worker,
+                        initargs=(
+                            self._agent_options,
+                            model_paths,
+                            trained_models,
+                        ),
+                    )
+        return self._pool
+
+    def _chunks(self, data):
+        """
+        Splits the data into chunks of at most chunk_size strings.
+        """
+
+        return [
+            data[start:start + self.chunk_size]
+            for start in range(0, len(data), self.chunk_size)
+        ]
+
+    def _predict(self, data, threshold=0.5, batch_size=None, n_process=None):
+        """
+        Predicts false positives in the given data, sharding it across the
+        worker processes. Small inputs are predicted in-process.
+        """
+
+        if self.workers <= 1 or len(data) <= self.chunk_size:
+            return super()._predict(data, threshold, batch_size, n_process)
+        results = self._get_pool().map(
+            _predict_chunk,
+            [(chunk, threshold, batch_size) for chunk in self._chunks(data)],
+        )
+        return [prediction for chunk in results for prediction in chunk]
+
+    def _predict_scores(self, data, batch_size=None, n_process=None):
+        """
+        Scores the given data, sharding it across the worker processes.
+        Small inputs are scored in-process.
+        """
+
+        import numpy as np
+
+        if self.workers <= 1 or len(data) <= self.chunk_size:
+            return super()._predict_scores(data, batch_size, n_process)
+        results = self._get_pool().map(
+            _scores_chunk,
+            [(chunk, batch_size) for chunk in self._chunks(data)],
+        )
+        return np.concatenate(results)
+
+    def _declutter(self, data, batch_size=None, n_process=None):
+        """
+        Keeps only the copyright entities of each string, sharding the data
+        across the worker processes. Small inputs are decluttered in-process.
+        """
+
+        if self.workers <= 1 or len(data) <= self.chunk_size:
+            return super()._declutter(data, batch_size, n_process)
+        results = self._get_pool().map(
+            _declutter_chunk,
+            [(chunk, batch_size) for chunk in self._chunks(data)],
+        )
+        return [text for chunk in results for text in chunk]
+
+    def _process(self, data, threshold=0.5, batch_size=None, n_process=None):
+        """
+        Predicts and declutters the given data, sharding it across the worker
+        processes. Small inputs are processed in-process.
+        """
+
+        if self.workers <= 1 or len(data) <= self.chunk_size:
+            return super()._process(data, threshold, batch_size, n_process)
+        results = self._get_pool().map(
+            _process_chunk,
+            [(chunk, threshold, batch_size) for chunk in self._chunks(data)],
+        )
+        predictions = [p for chunk, _ in results for p in chunk]
+        decluttered = [text for _, chunk in results for text in chunk]
+        return predictions, decluttered
+
+    def _update_fingerprints(self):
+        """
+        Restarts the workers whenever the models are loaded, trained or
+        swapped, while no call uses them, so that they use the new models.
+        """
+
+        self.close()
+        super()._update_fingerprints()
+
+    def _use_pickles(self):
+        """
+        Replaces the compact models with the pickles, in the workers spawned
+        later too.
+        """
+
+        super()._use_pickles()
+        self._agent_options["compact"] = self.compact
+
+    def _staging_copy(self):
+        """
+        Copies the agent to stage a model version into, without the worker
+        pool of the agent, which loading the staged models would stop.
+        """
+
+        staged = super()._staging_copy()
+        staged._pool = None
+        staged._agent_options = dict(self._agent_options)
+        return staged
+
+    def _swap_models(self):
+        """
+        Adopts the staged model version, making the spawned workers load its
+        models.
+        """
+
+        if self._staged is None:
+            return False
+        with self._lock.write():
+            swapped = super()._swap_models()
+            if swapped:
+                self._agent_options["model_dir"] = self.model_dir
+        return swapped
+
+    def close(self):
+        """
+        Stops the worker processes, once no call uses them.
+        """
+
+        if getattr(self, "_pool", None) is not None:
+            with self._lock.write():
+                if self._pool is not None:
+                    self._pool.terminate()
+                    self._pool.join()
+                    self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
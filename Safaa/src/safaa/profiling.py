@@ -0,0 +1,185 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+"""
+Profiler: opt-in per-stage instrumentation for SafaaAgent.
+"""
+
+import cProfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class StageStats:
+    """
+    The accumulated measurements of one stage.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.items = 0
+        self.seconds = 0.0
+        self.peak_memory = 0
+
+    @property
+    def throughput(self):
+        """
+        Items processed per second of wall time.
+        """
+        return self.items / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "items": self.items,
+            "seconds": self.seconds,
+            "items_per_second": self.throughput,
+            "peak_memory": self.peak_memory,
+        }
+
+
+class Profiler:
+    def __init__(self, track_memory=False):
+        """
+        Initializes a profiler recording the wall time and the number of
+        items processed by each stage of the agent.
+
+        Parameters:
+        track_memory (bool): Flag to also record the peak memory allocated
+                             by each stage using tracemalloc, which slows
+                             down allocations while enabled. The peak is
+                             global to the process, so the stages of
+                             concurrent calls report the allocations of
+                             each other. Defaults to False.
+        """
+
+        self.track_memory = track_memory
+        self._stages = {}
+        self._lock = threading.Lock()
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name, items=0):
+        """
+        Measures a stage. Stages must not be nested nor run from concurrent
+        threads when tracking memory.
+
+        Parameters:
+        name (str): The name of the stage.
+        items (int): The number of items the stage processes. Defaults to 0.
+        """
+
+        if self.track_memory:
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            peak_memory = 0
+            if self.track_memory:
+                peak_memory = tracemalloc.get_traced_memory()[1] - start_memory
+            with self._lock:
+                stats = self._stages.get(name)
+                if stats is None:
+                    stats = self._stages[name] = StageStats(name)
+                stats.calls += 1
+                stats.items += items
+                stats.seconds += seconds
+                stats.peak_memory = max(stats.peak_memory, peak_memory)
+
+    def stats(self):
+        """
+        Returns the measurements of every stage.
+
+        Returns:
+        dict: The calls, items, seconds, items per second and peak memory in
+              bytes, by stage name.
+        """
+
+        with self._lock:
+            return {
+                name: stats.as_dict() for name, stats in self._stages.items()
+            }
+
+    def reset(self):
+        """
+        Forgets every measurement.
+        """
+
+        with self._lock:
+            self._stages = {}
+
+    def to_prometheus(self, prefix="safaa"):
+        """
+        Dumps the measurements in the Prometheus text exposition format.
+
+        Parameters:
+        prefix (str): The prefix of the metric names. Defaults to "safaa".
+
+        Returns:
+        str: The metrics.
+        """
+
+        metrics = [
+            ("stage_calls_total", "counter", "calls",
+             "Number of times each stage ran."),
+            ("stage_items_total", "counter", "items",
+             "Number of items each stage processed."),
+            ("stage_seconds_total", "counter", "seconds",
+             "Wall time spent in each stage."),
+            ("stage_peak_memory_bytes", "gauge", "peak_memory",
+             "Peak memory allocated by a single run of each stage."),
+        ]
+        stats = self.stats()
+        lines = []
+        for name, kind, key, description in metrics:
+            lines.append(f"# HELP {prefix}_{name} {description}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for stage, values in stats.items():
+                lines.append(
+                    f'{prefix}_{name}{{stage="{stage}"}} {values[key]}'
+                )
+        return "\n".join(lines) + "\n"
+
+    @contextmanager
+    def cprofile(self, path=None):
+        """
+        Runs cProfile over the enclosed code.
+
+        Parameters:
+        path (str): File to dump the profile to, readable with pstats.
+                    Defaults to None.
+
+        Returns:
+        contextmanager: Yields the cProfile.Profile.
+        """
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield profile
+        finally:
+            profile.disable()
+            if path is not None:
+                profile.dump_stats(path)
+
+    def memory_snapshot(self):
+        """
+        Takes a tracemalloc snapshot of the memory allocated by Python,
+        starting tracemalloc if needed. Only allocations made after tracing
+        started are included.
+
+        Returns:
+        Snapshot: The tracemalloc snapshot.
+        """
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        return tracemalloc.take_snapshot()
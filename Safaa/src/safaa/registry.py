@@ -0,0 +1,296 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+"""
+ModelRegistry: versioned model directories with an atomically updated
+pointer to the current version.
+
+A registry directory holds:
+
+    versions/v000001/   a complete model directory, with a manifest.json
+    versions/v000002/   listing the SHA-256 checksum of each of its files
+    CURRENT             the name of the current version
+
+Versions are written to a temporary directory and renamed into place, and
+CURRENT is replaced with os.replace, so readers only ever see complete
+versions and a complete pointer.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from .Safaa import COMPACT_MODEL_DIR, SPACY_MODELS
+
+# Constants
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+
+
+def _checksum(path):
+    """
+    Returns the SHA-256 checksum of a file.
+    """
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _checksums(path):
+    """
+    Returns the checksum of each file of a directory, by relative path.
+    """
+
+    checksums = {}
+    for root, _, files in os.walk(path):
+        for name in files:
+            file_path = os.path.join(root, name)
+            relative_path = os.path.relpath(file_path, path)
+            if relative_path != MANIFEST_FILE:
+                checksums[relative_path.replace(os.sep, "/")] = _checksum(
+                    file_path
+                )
+    return dict(sorted(checksums.items()))
+
+
+class ModelRegistry:
+    def __init__(self, path):
+        """
+        Initializes a registry stored in the given directory, creating it if
+        needed.
+
+        Parameters:
+        path (str): The registry directory.
+        """
+
+        self.path = path
+        self.versions_path = os.path.join(path, VERSIONS_DIR)
+        os.makedirs(self.versions_path, exist_ok=True)
+
+    def versions(self):
+        """
+        Lists the published versions, oldest first.
+
+        Returns:
+        list: The version names.
+        """
+
+        return sorted(
+            name
+            for name in os.listdir(self.versions_path)
+            if not name.startswith(".")
+        )
+
+    def current(self):
+        """
+        Reads the current version.
+
+        Returns:
+        str: The current version name, or None if none was published.
+        """
+
+        try:
+            with open(
+                os.path.join(self.path, CURRENT_FILE), "r", encoding="utf-8"
+            ) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def version_path(self, version=None):
+        """
+        Returns the model directory of a version.
+
+        Parameters:
+        version (str): The version name. Defaults to None, for the current
+                       version.
+
+        Returns:
+        str: The model directory.
+        """
+
+        version = version or self.current()
+        if version is None:
+            raise ValueError(f"No model version published in {self.path}")
+        return os.path.join(self.versions_path, version)
+
+    def manifest(self, version=None):
+        """
+        Reads the manifest of a version.
+
+        Parameters:
+        version (str): The version name. Defaults to None, for the current
+                       version.
+
+        Returns:
+        dict: The manifest.
+        """
+
+        with open(
+            os.path.join(self.version_path(version), MANIFEST_FILE),
+            "r",
+            encoding="utf-8",
+        ) as f:
+            return json.load(f)
+
+    def verify(self, version=None):
+        """
+        Checks the files of a version against the checksums of its manifest.
+
+        Parameters:
+        version (str): The version name. Defaults to None, for the current
+                       version.
+
+        Raises:
+        ValueError: If a file is missing, unexpected or modified.
+        """
+
+        expected = self.manifest(version)["files"]
+        actual = _checksums(self.version_path(version))
+        if actual != expected:
+            changed = sorted(
+                name
+                for name in set(expected) | set(actual)
+                if expected.get(name) != actual.get(name)
+            )
+            raise ValueError(
+                f"Model version {version or self.current()} does not match "
+                f"its manifest: {', '.join(changed)}"
+            )
+
+    def publish(self, model_dir, activate=True):
+        """
+        Publishes a copy of a model directory as a new version.
+
+        Parameters:
+        model_dir (str): The model directory to copy.
+        activate (bool): Flag to make the new version current. Defaults to
+                         True.
+
+        Returns:
+        str: The new version name.
+        """
+
+        staging_path = tempfile.mkdtemp(
+            prefix=".staging-", dir=self.versions_path
+        )
+        try:
+            shutil.copytree(model_dir, staging_path, dirs_exist_ok=True)
+            return self._commit(staging_path, activate)
+        finally:
+            shutil.rmtree(staging_path, ignore_errors=True)
+
+    def publish_agent(self, agent, activate=True):
+        """
+        Publishes the models of an agent as a new version, including models
+        trained in memory.
+
+        Parameters:
+        agent (SafaaAgent): The agent whose models are published.
+        activate (bool): Flag to make the new version current. Defaults to
+                         True.
+
+        Returns:
+        str: The new version name.
+        """
+
+        staging_path = tempfile.mkdtemp(
+            prefix=".staging-", dir=self.versions_path
+        )
+        try:
+            # Keep the compact artifacts in sync with the saved pickles
+            if os.path.isdir(agent.compact_model_path):
+                os.makedirs(os.path.join(staging_path, COMPACT_MODEL_DIR))
+            # Write the models without switching a compact agent to the
+            # pickles, and fail rather than publish a partial version
+            agent._write_models(staging_path)
+            for name in SPACY_MODELS:
+                shutil.copytree(
+                    getattr(agent, f"{name}_path"),
+                    os.path.join(staging_path, name),
+                )
+            return self._commit(staging_path, activate)
+        finally:
+            shutil.rmtree(staging_path, ignore_errors=True)
+
+    def _commit(self, staging_path, activate):
+        """
+        Writes the manifest of a staged version and renames it into place
+        under the next free version name.
+        """
+
+        manifest = {
+            "format": FORMAT_VERSION,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "files": _checksums(staging_path),
+        }
+        with open(
+            os.path.join(staging_path, MANIFEST_FILE), "w", encoding="utf-8"
+        ) as f:
+            json.dump(manifest, f, indent=2)
+        os.chmod(staging_path, 0o755)
+
+        # Renaming onto a version another publisher has just taken fails,
+        # in which case the next name is tried
+        while True:
+            versions = self.versions()
+            number = int(versions[-1][1:]) + 1 if versions else 1
+            version = f"v{number:06d}"
+            try:
+                os.rename(staging_path, self.version_path(version))
+                break
+            except OSError:
+                if not os.path.exists(self.version_path(version)):
+                    raise
+
+        if activate:
+            self.activate(version)
+        return version
+
+    def activate(self, version):
+        """
+        Makes a published version current, replacing the pointer atomically.
+
+        Parameters:
+        version (str): The version name.
+        """
+
+        if not os.path.isdir(self.version_path(version)):
+            raise ValueError(f"Unknown model version: {version}")
+        pointer_path = os.path.join(self.path, CURRENT_FILE)
+        temporary_path = f"{pointer_path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            f.write(version + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary_path, pointer_path)
+
+    def prune(self, keep=3):
+        """
+        Removes the oldest versions, keeping the current one.
+
+        Parameters:
+        keep (int): Number of most recent versions to keep. Defaults to 3.
+
+        Returns:
+        list: The removed version names.
+        """
+
+        current = self.current()
+        removed = [
+            version
+            for version in self.versions()[:-keep or None]
+            if version != current
+        ]
+        for version in removed:
+            shutil.rmtree(self.version_path(version))
+        return removed
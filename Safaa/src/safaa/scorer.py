@@ -0,0 +1,178 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+"""
+LinearScorer: scores strings with a fitted TfidfVectorizer and SGDClassifier
+in plain Python, without the input validation and sparse matrix overhead
+scikit-learn pays on every call.
+"""
+
+from collections import Counter
+from math import exp, log, sqrt
+
+PROBABILISTIC_LOSSES = ("log_loss", "log", "modified_huber")
+
+
+class LinearScorer:
+    def __init__(self, vectorizer, detector):
+        """
+        Initializes a scorer computing the same decision values as
+        detector.decision_function(vectorizer.transform(data)), performing
+        the same floating point operations in the same order.
+
+        Use from_models to check that the models are supported.
+
+        Parameters:
+        vectorizer (TfidfVectorizer): The fitted vectorizer.
+        detector (SGDClassifier): The fitted binary classifier.
+        """
+
+        tfidf = vectorizer._tfidf
+        self.analyzer = vectorizer.build_analyzer()
+        self.vocabulary = vectorizer.vocabulary_
+        self.binary = vectorizer.binary
+        self.sublinear_tf = tfidf.sublinear_tf
+        self.norm = tfidf.norm
+        # The vectorizer only applies idf weighting when it exposes idf_,
+        # which vectorizers pickled by older scikit-learn versions do not
+        self.idf = tfidf.idf_.tolist() if hasattr(tfidf, "idf_") else None
+        self.coef = detector.coef_[0].tolist()
+        self.intercept = float(detector.intercept_[0])
+        self.classes = detector.classes_.tolist()
+        self.loss = detector.loss
+        self.probabilistic = hasattr(detector, "predict_proba")
+
+    @classmethod
+    def from_models(cls, vectorizer, detector):
+        """
+        Creates a scorer for the given models, if they are supported.
+
+        Parameters:
+        vectorizer (object): The vectorizer of the agent.
+        detector (object): The false positive detector of the agent.
+
+        Returns:
+        LinearScorer: The scorer, or None if the models are not a
+                      TfidfVectorizer and a binary SGDClassifier.
+        """
+
+        if (
+            type(vectorizer).__name__ != "TfidfVectorizer"
+            or type(detector).__name__ != "SGDClassifier"
+            or not hasattr(vectorizer, "vocabulary_")
+            or not hasattr(detector, "coef_")
+            or detector.coef_.shape[0] != 1
+            or vectorizer._tfidf.norm not in ("l2", None)
+        ):
+            return None
+        if hasattr(detector, "predict_proba") and (
+            detector.loss not in PROBABILISTIC_LOSSES
+        ):
+            return None
+        return cls(vectorizer, detector)
+
+    def _decision(self, text):
+        """
+        Computes the decision value of a single string.
+        """
+
+        # Count the vocabulary terms of the string, in column order
+        vocabulary = self.vocabulary
+        terms = self.analyzer(text)
+        if self.binary:
+            counts = {
+                vocabulary[term]: 1.0 for term in terms if term in vocabulary
+            }
+        else:
+            counts = {
+                vocabulary[term]: float(count)
+                for term, count in Counter(terms).items()
+                if term in vocabulary
+            }
+        columns = sorted(counts)
+
+        # Weight and normalize the term values like TfidfTransformer
+        values = [counts[column] for column in columns]
+        if self.sublinear_tf:
+            values = [log(value) + 1.0 for value in values]
+        if self.idf is not None:
+            idf = self.idf
+            values = [
+                value * idf[column] for value, column in zip(values, columns)
+            ]
+        if self.norm == "l2":
+            total = 0.0
+            for value in values:
+                total += value * value
+            if total != 0.0:
+                total = sqrt(total)
+                values = [value / total for value in values]
+
+        # Take the dot product with the coefficients
+        coef = self.coef
+        score = 0.0
+        for value, column in zip(values, columns):
+            score += coef[column] * value
+        return score + self.intercept
+
+    def decision_function(self, data):
+        """
+        Computes the signed distance of each string to the hyperplane.
+
+        Parameters:
+        data (list): A list of preprocessed strings.
+
+        Returns:
+        list: The decision values.
+        """
+
+        return [self._decision(text) for text in data]
+
+    def predict(self, data):
+        """
+        Predicts the class label of each string.
+
+        Parameters:
+        data (list): A list of preprocessed strings.
+
+        Returns:
+        list: The class labels.
+        """
+
+        negative, positive = self.classes
+        return [
+            positive if score > 0 else negative
+            for score in self.decision_function(data)
+        ]
+
+    def predict_proba(self, data):
+        """
+        Predicts the probability of the positive class of each string, for
+        detectors trained with a probabilistic loss.
+
+        Parameters:
+        data (list): A list of preprocessed strings.
+
+        Returns:
+        list: The probabilities of the positive class.
+        """
+
+        scores = self.decision_function(data)
+        if self.loss == "modified_huber":
+            return [
+                (min(max(score, -1.0), 1.0) + 1.0) / 2.0 for score in scores
+            ]
+        return [_expit(score) for score in scores]
+
+
+def _expit(score):
+    """
+    Computes the logistic sigmoid like scipy.special.expit, which returns 0
+    where exp overflows.
+    """
+
+    try:
+        return 1.0 / (1.0 + exp(-score))
+    except OverflowError:
+        return 0.0
@@ -0,0 +1,319 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+"""
+SafaaServer: a resident SafaaAgent answering requests over a local socket.
+
+The protocol is newline-delimited JSON. Each request is an object with an
+"op" of "predict", "declutter", "stats" or "ping":
+
+    {"op": "predict", "data": ["..."], "threshold": 0.5}
+    {"op": "declutter", "data": ["..."], "predictions": ["t"]}
+
+and each response is either {"result": ...} or {"error": "..."}.
+"""
+
+import json
+import os
+import queue
+import socketserver
+import stat
+import threading
+import time
+
+# Constants
+DEFAULT_MAX_BATCH_SIZE = 1000
+DEFAULT_MAX_WAIT = 0.005
+
+
+class _Request:
+    """
+    A request waiting in the micro-batcher queue.
+    """
+
+    def __init__(self, op, data, predictions=None, threshold=0.5):
+        self.op = op
+        self.data = data
+        self.predictions = predictions
+        self.threshold = threshold
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    @property
+    def group(self):
+        """
+        The requests of a group can be answered by a single agent call.
+        """
+        return (self.op, self.threshold if self.op == "predict" else None)
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        agent,
+        max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+        max_wait=DEFAULT_MAX_WAIT,
+    ):
+        """
+        Initializes the micro-batcher, which coalesces concurrent requests
+        into single agent calls from a background thread.
+
+        Parameters:
+        agent (SafaaAgent): The agent answering the requests.
+        max_batch_size (int): Number of strings after which a batch is run
+                              without waiting for more requests. Defaults to
+                              DEFAULT_MAX_BATCH_SIZE.
+        max_wait (float): Seconds to wait for more requests after the first
+                          one of a batch. Defaults to DEFAULT_MAX_WAIT.
+        """
+
+        self.agent = agent
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.requests = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, op, data, predictions=None, threshold=0.5):
+        """
+        Queues a request and waits for its result.
+
+        Parameters:
+        op (str): Either "predict" or "declutter".
+        data (list): The strings to process.
+        predictions (list): The predictions of the strings, for declutter.
+                            Defaults to None.
+        threshold (float): The probability threshold, for predict. Defaults
+                           to 0.5.
+
+        Returns:
+        list: The predictions or the decluttered strings.
+        """
+
+        request = _Request(op, data, predictions, threshold)
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _run(self):
+        """
+        Collects the queued requests into batches and answers them.
+        """
+
+        while True:
+            # Wait for a first request, then for more until the batch is full
+            # or the waiting time is over
+            batch = [self._queue.get()]
+            size = len(batch[0].data)
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request.data)
+
+            # Answer each group of compatible requests with one agent call
+            groups = {}
+            for request in batch:
+                groups.setdefault(request.group, []).append(request)
+            for requests in groups.values():
+                self._answer(requests)
+            self.batches += 1
+            self.requests += len(batch)
+
+    def _answer(self, requests):
+        """
+        Answers compatible requests with a single agent call.
+        """
+
+        data = [text for request in requests for text in request.data]
+        try:
+            if requests[0].op == "predict":
+                results = self.agent.predict(data, requests[0].threshold)
+            else:
+                predictions = [
+                    prediction
+                    for request in requests
+                    for prediction in request.predictions
+                ]
+                results = self.agent.declutter(data, predictions)
+        except Exception as error:
+            for request in requests:
+                request.error = error
+                request.done.set()
+            return
+
+        # Split the results back between the requests
+        start = 0
+        for request in requests:
+            end = start + len(request.data)
+            request.result = results[start:end]
+            start = end
+            request.done.set()
+
+
+def _string_list(request, key):
+    """
+    Returns a field of a request, which must be a list of strings.
+    """
+
+    value = request.get(key)
+    if not isinstance(value, list) or not all(
+        isinstance(item, str) for item in value
+    ):
+        raise ValueError(f"{key} must be a list of strings")
+    return value
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """
+    Answers the newline-delimited JSON requests of a connection.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                response = {"result": self.server.safaa.handle(json.loads(line))}
+            except Exception as error:
+                response = {"error": f"{type(error).__name__}: {error}"}
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SafaaServer:
+    def __init__(
+        self,
+        agent,
+        socket_path=None,
+        host="127.0.0.1",
+        port=None,
+        max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+        max_wait=DEFAULT_MAX_WAIT,
+    ):
+        """
+        Initializes the server, listening on a Unix domain socket or on a
+        local TCP port.
+
+        Parameters:
+        agent (SafaaAgent): The resident agent answering the requests.
+        socket_path (str): Path of the Unix domain socket. Defaults to None.
+        host (str): Host to listen on when no socket path is given. Defaults
+                    to "127.0.0.1".
+        port (int): TCP port to listen on when no socket path is given.
+                    Defaults to None.
+        max_batch_size (int): Number of strings after which a batch is run.
+                              Defaults to DEFAULT_MAX_BATCH_SIZE.
+        max_wait (float): Seconds to wait for concurrent requests to batch.
+                          Defaults to DEFAULT_MAX_WAIT.
+        """
+
+        if socket_path is None and port is None:
+            raise ValueError("Either a socket path or a port is required")
+
+        self.agent = agent
+        self.socket_path = socket_path
+
+        if socket_path is not None:
+            # Remove a stale socket left by a previous server, but no other
+            # kind of file
+            if os.path.exists(socket_path):
+                if not stat.S_ISSOCK(os.stat(socket_path).st_mode):
+                    raise FileExistsError(
+                        f"Not a socket, refusing to replace it: {socket_path}"
+                    )
+                os.remove(socket_path)
+            self._server = _UnixServer(socket_path, _RequestHandler)
+        else:
+            self._server = _TCPServer((host, port), _RequestHandler)
+        self._server.safaa = self
+        self.batcher = MicroBatcher(agent, max_batch_size, max_wait)
+
+    @property
+    def address(self):
+        """
+        The socket path or (host, port) pair the server listens on.
+        """
+        return self._server.server_address
+
+    def handle(self, request):
+        """
+        Answers a decoded request.
+
+        Parameters:
+        request (dict): The request.
+
+        Returns:
+        object: The result of the request.
+        """
+
+        op = request.get("op")
+        if op == "ping":
+            return "pong"
+        if op == "stats":
+            return {
+                "requests": self.batcher.requests,
+                "batches": self.batcher.batches,
+                "cache": (
+                    self.agent.cache.stats()
+                    if self.agent.cache is not None
+                    else None
+                ),
+            }
+        if op == "predict":
+            data = _string_list(request, "data")
+            threshold = request.get("threshold", 0.5)
+            if isinstance(threshold, bool) or not isinstance(
+                threshold, (int, float)
+            ):
+                raise ValueError("threshold must be a number")
+            return self.batcher.submit(op, data, threshold=threshold)
+        if op == "declutter":
+            data = _string_list(request, "data")
+            predictions = _string_list(request, "predictions")
+            if len(data) != len(predictions):
+                raise ValueError("data and predictions differ in length")
+            return self.batcher.submit(op, data, predictions=predictions)
+        raise ValueError(f"Unknown op: {op!r}")
+
+    def serve_forever(self):
+        """
+        Answers requests until shutdown() is called.
+        """
+
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if self.socket_path is not None and os.path.exists(
+                self.socket_path
+            ):
+                os.remove(self.socket_path)
+
+    def shutdown(self):
+        """
+        Stops serve_forever(), from another thread.
+        """
+
+        self._server.shutdown()
@@ -4,10 +4,21 @@
 
 from tqdm import tqdm
 import json
+import multiprocessing
+import os
 import re
+import time
+from collections import deque
+from itertools import islice
 import spacy
 from sklearn.model_selection import train_test_split
 
+# Number of documents converted per chunk, and written per shard when sharding
+DEFAULT_CHUNK_SIZE = 10000
+
+# The blank pipeline of a conversion worker process
+_worker_nlp = None
+
 
 def text_to_json(sentences):
     """
@@ -21,20 +32,32 @@ def text_to_json(sentences):
     return new_json
 
 
-def text_to_json_model_assisted(sentences, model):
+def text_to_json_model_assisted(sentences, model, batch_size=1000,
+                                n_process=1):
     """
     Convert list of sentences to a JSON format using a model for predictions.
     """
-    sentences = model(sentences)
-    new_json = list()
+    return list(iter_text_to_json_model_assisted(sentences, model, batch_size,
+                                                 n_process))
+
+
+def iter_text_to_json_model_assisted(sentences, model, batch_size=1000,
+                                     n_process=1):
+    """
+    Lazily convert any iterable of sentences to the JSON format using a model
+    for predictions, running the model over batches in `n_process`
+    processes. Pass the result to `write_json_to_disk` to stream a large
+    dataset to disk.
+    """
+    sentences = model.pipe(sentences, batch_size=batch_size,
+                           n_process=n_process)
     for sentence in tqdm(sentences):
         labels = list()
         for e in sentence.ents:  # Iterating through detected entities in the sentence
             # Appending start, end character positions and label of the entity
             labels.append([e.start_char, e.end_char, e.label_])
-        # Appending the sentence and its detected labels to the resulting JSON
-        new_json.append({'text': sentence.text, "labels": labels})
-    return new_json
+        # Yielding the sentence and its detected labels
+        yield {'text': sentence.text, "labels": labels}
 
 
 def text_to_json_labels_separate(sentences, labels, entity_name):
@@ -71,50 +94,171 @@ def write_json_to_disk(new_json, path):
             f.write(json.dumps(item) + '\n')
 
 
-def convert_jsonl_to_spacy(jsonl_path, spacy_path):
+def _init_conversion_worker():
     """
-    Load data from a JSONL file and convert it to spaCy's training format.
+    Create the blank pipeline used to tokenize documents, once per process.
+    """
+    global _worker_nlp
+    if _worker_nlp is None:
+        _worker_nlp = spacy.blank('en')
+
+
+def _convert_chunk(lines):
+    """
+    Convert a chunk of JSONL lines to a serialized DocBin.
     """
+    _init_conversion_worker()
     data = []
-    with open(jsonl_path, 'r') as f:
-        for line in f:
-            item = json.loads(line)
-            text = item['text']
-            # Extracting entities from the JSONL line
-            entities = [(e[0], e[1], e[2]) for e in item['labels']]
-            data.append((text, {'entities': entities}))
-
-    nlp = spacy.blank('en')  # Creating a blank English NLP object
+    for line in lines:
+        item = json.loads(line)
+        # Extracting entities from the JSONL line
+        labels = item.get('labels', item.get('label', []))
+        entities = [(e[0], e[1], e[2]) for e in labels]
+        data.append((item['text'], {'entities': entities}))
+
     doc_bin = spacy.tokens.DocBin()  # Initializing a DocBin for efficient storage of `Doc` objects
-    for text, annotations in data:
-        doc = nlp.make_doc(text)  # Creating a `Doc` object from text
-        example = spacy.training.Example.from_dict(doc,
-                                                   annotations)  # Creating an example from the `Doc` and its annotations
+    docs = _worker_nlp.pipe((text for text, _ in data), batch_size=1000)
+    for doc, (_, annotations) in zip(docs, data):
+        # Creating an example from the `Doc` and its annotations
+        example = spacy.training.Example.from_dict(doc, annotations)
         doc_bin.add(example.reference)  # Adding the `Doc` to the DocBin
-    doc_bin.to_disk(spacy_path)  # Saving the DocBin to disk
+    return len(doc_bin), doc_bin.to_bytes()
+
+
+def _converted_chunks(chunks, n_process):
+    """
+    Convert chunks of JSONL lines in `n_process` processes, yielding the
+    results in order while keeping at most two chunks per process in flight
+    so that memory stays bounded.
+    """
+    if n_process <= 1:
+        yield from map(_convert_chunk, chunks)
+        return
+    with multiprocessing.Pool(n_process,
+                              initializer=_init_conversion_worker) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(_convert_chunk, (chunk,)))
+            if len(pending) >= 2 * n_process:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def _read_chunks(jsonl_path, chunk_size):
+    """
+    Lazily read the non-empty lines of a JSONL file in chunks.
+    """
+    with open(jsonl_path, 'r', encoding='utf-8') as f:
+        lines = (line for line in f if line.strip())
+        while True:
+            chunk = list(islice(lines, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+
+def _shard_path(directory, index):
+    return os.path.join(directory, f"shard-{index:05d}.spacy")
+
+
+def convert_jsonl_to_spacy(jsonl_path, spacy_path, n_process=1,
+                           chunk_size=DEFAULT_CHUNK_SIZE, sharded=False):
+    """
+    Load data from a JSONL file and convert it to spaCy's training format.
+
+    The file is read in chunks of `chunk_size` lines converted by `n_process`
+    processes. With `sharded`, `spacy_path` is a directory receiving one
+    DocBin per chunk, which spaCy's corpus reader accepts as is, and memory
+    stays bounded whatever the size of the input. Otherwise the chunks are
+    merged into a single DocBin file.
+
+    Returns the number of converted documents.
+    """
+    start = time.perf_counter()
+    merged = None
+    if sharded:
+        os.makedirs(spacy_path, exist_ok=True)
+
+    count = 0
+    chunks = _converted_chunks(_read_chunks(jsonl_path, chunk_size),
+                               n_process)
+    for index, (size, data) in enumerate(tqdm(chunks, unit='chunk')):
+        count += size
+        if sharded:
+            # Writing each chunk as its own shard
+            with open(_shard_path(spacy_path, index), 'wb') as f:
+                f.write(data)
+        else:
+            doc_bin = spacy.tokens.DocBin().from_bytes(data)
+            if merged is None:
+                merged = doc_bin
+            else:
+                merged.merge(doc_bin)
+    if not sharded:
+        (merged or spacy.tokens.DocBin()).to_disk(spacy_path)  # Saving the DocBin to disk
+
+    seconds = time.perf_counter() - start
+    print(f"Converted {count} docs in {seconds:.1f}s "
+          f"({count / seconds:.0f} docs/sec)")
+    return count
+
+
+def _docbin_paths(path):
+    """
+    List the DocBin files of a .spacy file or of a directory of shards.
+    """
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, name) for name in os.listdir(path)
+                      if name.endswith('.spacy'))
+    return [path]
 
 
 def spacy_train_test_split(file_path, split=0.2, random_state=42, shuffle=True):
     """
     Split spaCy formatted data into training and testing sets.
+
+    `file_path` is a .spacy file or a directory of shards. The documents are
+    streamed one DocBin at a time, using the vocabulary of a blank pipeline,
+    and keep their original order within each set. A directory is split
+    into `<directory>-train` and `<directory>-test` directories of shards.
     """
-    doc_bin = spacy.tokens.DocBin().from_disk(
-        file_path)  # Loading the DocBin from disk
-    nlp = spacy.load("en_core_web_sm")  # Loading the English small core model
-    docs = list(doc_bin.get_docs(
-        nlp.vocab))  # Retrieving `Doc` objects from the DocBin using the model's vocabulary
-    # Splitting the `Doc` objects into training and testing sets
-    train_docs, test_docs = train_test_split(docs, test_size=split,
-                                             random_state=random_state,
-                                             shuffle=shuffle)
-    train_doc_bin = spacy.tokens.DocBin(
-        docs=train_docs)  # Creating a DocBin for training docs
-    test_doc_bin = spacy.tokens.DocBin(
-        docs=test_docs)  # Creating a DocBin for testing docs
+    vocab = spacy.blank('en').vocab  # Only the string store is needed
+    paths = _docbin_paths(file_path)
+    sharded = os.path.isdir(file_path)
+
+    # Splitting the document indices rather than the documents themselves
+    sizes = [len(spacy.tokens.DocBin().from_disk(path)) for path in paths]
+    _, test_indices = train_test_split(range(sum(sizes)), test_size=split,
+                                       random_state=random_state,
+                                       shuffle=shuffle)
+    test_indices = set(test_indices)
 
     # Deriving the paths for saving the training and testing DocBins
-    train_path = file_path.split('.spacy')[0] + '-train.spacy'
-    test_path = file_path.split('.spacy')[0] + '-test.spacy'
+    base = file_path.rstrip(os.sep) if sharded else file_path.split('.spacy')[0]
+    train_path = base + ('-train' if sharded else '-train.spacy')
+    test_path = base + ('-test' if sharded else '-test.spacy')
+    if sharded:
+        os.makedirs(train_path, exist_ok=True)
+        os.makedirs(test_path, exist_ok=True)
 
-    train_doc_bin.to_disk(train_path)  # Saving the training DocBin to disk
-    test_doc_bin.to_disk(test_path)  # Saving the testing DocBin to disk
+    train_doc_bin = spacy.tokens.DocBin()  # Creating a DocBin for training docs
+    test_doc_bin = spacy.tokens.DocBin()  # Creating a DocBin for testing docs
+    index = 0
+    for shard, path in enumerate(paths):
+        doc_bin = spacy.tokens.DocBin().from_disk(path)  # Loading the DocBin from disk
+        for doc in doc_bin.get_docs(vocab):
+            if index in test_indices:
+                test_doc_bin.add(doc)
+            else:
+                train_doc_bin.add(doc)
+            index += 1
+        if sharded:
+            # Writing the documents of each shard to their own shards
+            train_doc_bin.to_disk(_shard_path(train_path, shard))
+            test_doc_bin.to_disk(_shard_path(test_path, shard))
+            train_doc_bin = spacy.tokens.DocBin()
+            test_doc_bin = spacy.tokens.DocBin()
+    if not sharded:
+        train_doc_bin.to_disk(train_path)  # Saving the training DocBin to disk
+        test_doc_bin.to_disk(test_path)  # Saving the testing DocBin to disk
@@ -0,0 +1,82 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+import json
+import subprocess
+import sys
+from argparse import ArgumentParser
+from statistics import median
+
+# Measures one fresh interpreter loading the vectorizer and the detector,
+# then classifying a string so that the pages it touches are counted
+LOAD_SCRIPT = """
+import json, sys, time
+
+def memory():
+    # Resident and private memory in bytes, from smaps_rollup on Linux
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    return values["Rss"], values["Private_Clean"] + values["Private_Dirty"]
+
+from safaa.Safaa import SafaaAgent
+import joblib, numpy, scipy.sparse, sklearn.linear_model
+agent = SafaaAgent(model_dir=sys.argv[1] or None, compact=sys.argv[2] == "compact")
+rss, private = memory()
+start = time.perf_counter()
+agent.vectorizer
+agent.false_positive_detector
+loaded = time.perf_counter()
+agent._classify(["copyright (c) date entity"])
+classified = time.perf_counter()
+loaded_rss, loaded_private = memory()
+print(json.dumps({
+    "load": loaded - start,
+    "first_classification": classified - loaded,
+    "rss": loaded_rss - rss,
+    "private": loaded_private - private,
+}))
+"""
+
+
+def measure(model_dir, artifact_format, runs):
+    """
+    Run the load script in `runs` fresh interpreters and return the median
+    of each measurement.
+    """
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", LOAD_SCRIPT, model_dir or "",
+             artifact_format],
+            check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.splitlines()[-1]))
+    return {key: median(result[key] for result in results)
+            for key in results[0]}
+
+
+def main():
+    parser = ArgumentParser(description="Compare the load time and memory "
+                                        "of the pickled and the compact "
+                                        "vectorizer and detector")
+    parser.add_argument("--model-dir", default=None,
+                        help="Directory holding the Safaa models, converted "
+                             "with 'safaa convert'")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    for artifact_format in ("pickle", "compact"):
+        result = measure(args.model_dir, artifact_format, args.runs)
+        print(f"{artifact_format}: load {result['load'] * 1000:.1f} ms, "
+              f"first classification "
+              f"{result['first_classification'] * 1000:.1f} ms, "
+              f"RSS +{result['rss'] / 2 ** 20:.1f} MB, "
+              f"private +{result['private'] / 2 ** 20:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+import asyncio
+import json
+import time
+from argparse import ArgumentParser
+from statistics import quantiles
+
+from safaa.aio import AsyncSafaaAgent
+from safaa.Safaa import SafaaAgent
+
+
+def read_texts(jsonl_path, limit):
+    """
+    Read the texts of the first `limit` lines of a JSONL dataset.
+    """
+    texts = []
+    with open(jsonl_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if len(texts) >= limit:
+                break
+            texts.append(json.loads(line)['text'])
+    return texts
+
+
+async def monitor_loop(interval, lags, stop):
+    """
+    Record how late the event loop wakes a task sleeping `interval` seconds.
+    """
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - start - interval)
+
+
+async def client(call, texts, requests, size, latencies):
+    """
+    Send `requests` sequential requests of `size` strings each.
+    """
+    for i in range(requests):
+        start = (i * size) % max(len(texts) - size, 1)
+        sample = texts[start:start + size]
+        begin = time.perf_counter()
+        predictions = await call("predict", sample)
+        await call("declutter", sample, predictions)
+        latencies.append(time.perf_counter() - begin)
+
+
+async def load_test(call, texts, args):
+    """
+    Run concurrent clients and report the request latency percentiles, the
+    throughput and the worst event loop stall.
+    """
+    latencies, lags = [], []
+    stop = asyncio.Event()
+    monitor = asyncio.ensure_future(monitor_loop(0.001, lags, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        client(call, texts, args.requests, args.size, latencies)
+        for _ in range(args.clients)
+    ))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await monitor
+    percentiles = quantiles(latencies, n=100)
+    return {
+        "p50_ms": percentiles[49] * 1000,
+        "p99_ms": percentiles[98] * 1000,
+        "requests_per_second": len(latencies) / elapsed,
+        "max_loop_lag_ms": max(lags, default=0) * 1000,
+    }
+
+
+async def main_async(args):
+    texts = read_texts(args.jsonl_file, args.limit)
+    # The cache is off and deduplication only acts within a call, so
+    # repeated samples are processed again
+    agent = SafaaAgent(model_dir=args.model_dir)
+    agent._load_models(eager=True)
+
+    # Calling the agent directly blocks the event loop for each request
+    async def blocking(op, data, predictions=None):
+        if op == "predict":
+            return agent.predict(data)
+        return agent.declutter(data, predictions)
+
+    results = {"blocking": await load_test(blocking, texts, args)}
+
+    async with AsyncSafaaAgent(agent, max_batch_size=args.max_batch_size,
+                               max_wait=args.max_wait) as async_agent:
+        async def coalesced(op, data, predictions=None):
+            if op == "predict":
+                return await async_agent.apredict(data)
+            return await async_agent.adeclutter(data, predictions)
+
+        results["async"] = await load_test(coalesced, texts, args)
+        print(f"{async_agent.requests} requests answered in "
+              f"{async_agent.batches} batches")
+
+    for mode, result in results.items():
+        print(f"{mode}: p50 {result['p50_ms']:.1f} ms, "
+              f"p99 {result['p99_ms']:.1f} ms, "
+              f"{result['requests_per_second']:.1f} requests/sec, "
+              f"max event loop lag {result['max_loop_lag_ms']:.1f} ms")
+
+
+def main():
+    parser = ArgumentParser(description="Load test predict and declutter "
+                                        "under concurrent asyncio clients, "
+                                        "called directly on the event loop "
+                                        "and through AsyncSafaaAgent")
+    parser.add_argument("--jsonl-file",
+                        default="datasets/json/declutter_dataset_full.jsonl")
+    parser.add_argument("--model-dir", default=None,
+                        help="Directory holding the Safaa models")
+    parser.add_argument("--limit", type=int, default=5000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=20,
+                        help="Requests sent by each client")
+    parser.add_argument("--size", type=int, default=5,
+                        help="Strings per request")
+    parser.add_argument("--max-batch-size", type=int, default=1000)
+    parser.add_argument("--max-wait", type=float, default=0.005)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
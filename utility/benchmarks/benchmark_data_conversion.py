@@ -0,0 +1,63 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+import os
+import resource
+import shutil
+import sys
+import tempfile
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "NER"))
+from data_conversion import convert_jsonl_to_spacy  # noqa: E402
+
+
+def write_scaled_dataset(jsonl_path, scale, output_path):
+    """
+    Write the JSONL dataset repeated `scale` times.
+    """
+    with open(jsonl_path, 'r', encoding='utf-8') as f:
+        lines = [line if line.endswith('\n') else line + '\n'
+                 for line in f if line.strip()]
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for _ in range(scale):
+            f.writelines(lines)
+    return len(lines) * scale
+
+
+def main():
+    parser = ArgumentParser(description="Measure the throughput and peak "
+                                        "memory of the sharded JSONL to "
+                                        "spaCy conversion on a scaled up "
+                                        "dataset")
+    parser.add_argument("--jsonl-file",
+                        default="datasets/json/declutter_dataset_full.jsonl")
+    parser.add_argument("--scale", type=int, default=100,
+                        help="Number of times the dataset is repeated")
+    parser.add_argument("--n-process", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        jsonl_path = os.path.join(directory, "scaled.jsonl")
+        lines = write_scaled_dataset(args.jsonl_file, args.scale, jsonl_path)
+        print(f"{lines} lines, "
+              f"{os.path.getsize(jsonl_path) / 2 ** 20:.0f} MB")
+        convert_jsonl_to_spacy(jsonl_path, os.path.join(directory, "shards"),
+                               n_process=args.n_process,
+                               chunk_size=args.chunk_size, sharded=True)
+
+        # ru_maxrss is in kilobytes on Linux
+        parent = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        print(f"peak RSS: parent {parent / 1024:.0f} MB, "
+              f"largest worker {children / 1024:.0f} MB")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
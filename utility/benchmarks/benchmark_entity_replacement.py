@@ -0,0 +1,98 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+import json
+import re
+import time
+from argparse import ArgumentParser
+
+from spacy.tokens import Span
+
+from safaa.Safaa import SafaaAgent
+
+
+def legacy_replace_entity_spans(doc):
+    """
+    Replace every occurrence of each ENT entity text with ' ENTITY ', as
+    done before the replacement used the entity offsets.
+    """
+    new_sentence = doc.text
+    for entity in doc.ents:
+        if entity.label_ == "ENT":
+            new_sentence = re.sub(re.escape(entity.text), " ENTITY ",
+                                  new_sentence)
+    return new_sentence
+
+
+def compare_on_dataset(agent, jsonl_path):
+    """
+    Compare the legacy and span-based replacement on a JSONL dataset, both
+    on the replaced text and on the resulting predictions.
+    """
+    with open(jsonl_path, 'r', encoding='utf-8') as f:
+        texts = [json.loads(line)['text'] for line in f]
+
+    docs = agent._pipe(agent.entity_recognizer, texts, lambda doc: doc, list)
+    legacy = [legacy_replace_entity_spans(doc) for doc in docs]
+    current = [agent._replace_entity_spans(doc) for doc in docs]
+    differing = [i for i, (a, b) in enumerate(zip(legacy, current)) if a != b]
+
+    def classify(replaced):
+        vectorized = agent.vectorizer.transform(
+            agent._perform_text_substitutions(replaced))
+        return agent.false_positive_detector.predict(vectorized)
+
+    label_changes = (classify(legacy) != classify(current)).sum()
+    print(f"{len(texts)} texts: {len(differing)} replaced texts differ, "
+          f"{label_changes} predictions differ")
+    for i in differing[:5]:
+        print(f"  legacy:  {legacy[i]!r}")
+        print(f"  current: {current[i]!r}")
+
+
+def make_multi_entity_doc(nlp, n_entities, words_between=5):
+    """
+    Build a long doc with n_entities ENT entities, each entity text also
+    repeated outside of the entities.
+    """
+    words = []
+    starts = []
+    for i in range(n_entities):
+        starts.append(len(words))
+        words.extend([f"Holder{i}", "Inc."])
+        words.extend(["and", f"Holder{i}"] + ["text"] * words_between)
+    doc = nlp.make_doc(" ".join(words))
+    doc.ents = [Span(doc, start, start + 2, label="ENT") for start in starts]
+    return doc
+
+
+def main():
+    parser = ArgumentParser(description="Check the span-based entity "
+                                        "replacement against the legacy "
+                                        "re.sub replacement")
+    parser.add_argument("--jsonl-file",
+                        default="datasets/json/declutter_dataset.jsonl",
+                        help="Path to the JSONL dataset to compare on")
+    parser.add_argument("--model-dir", default=None,
+                        help="Directory holding the Safaa models")
+    args = parser.parse_args()
+
+    agent = SafaaAgent(model_dir=args.model_dir)
+    compare_on_dataset(agent, args.jsonl_file)
+
+    for n_entities in (10, 100, 1000):
+        doc = make_multi_entity_doc(agent.entity_recognizer, n_entities)
+        timings = []
+        for function in (legacy_replace_entity_spans,
+                         agent._replace_entity_spans):
+            start = time.perf_counter()
+            function(doc)
+            timings.append(time.perf_counter() - start)
+        print(f"{n_entities} entities, {len(doc.text)} chars: "
+              f"legacy {timings[0] * 1000:.2f} ms, "
+              f"span-based {timings[1] * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+import json
+import shutil
+import tempfile
+import threading
+import time
+from argparse import ArgumentParser
+from statistics import quantiles
+
+from safaa.parallel import ParallelSafaaAgent
+from safaa.registry import ModelRegistry
+from safaa.Safaa import SafaaAgent
+
+
+def read_texts(jsonl_path, limit):
+    """
+    Read the texts of the first `limit` lines of a JSONL dataset.
+    """
+    texts = []
+    with open(jsonl_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if len(texts) >= limit:
+                break
+            texts.append(json.loads(line)['text'])
+    return texts
+
+
+def publisher(registry, model_dir, versions, interval, stop):
+    """
+    Publish a new version of the models every `interval` seconds.
+    """
+    for _ in range(versions):
+        if stop.wait(interval):
+            return
+        registry.publish(model_dir)
+
+
+def check_staging_keeps_pool(agent, registry):
+    """
+    Stage the current version into a parallel agent and check that its
+    running worker pool is left alone.
+    """
+    pool = agent._get_pool()
+    agent._stage_version(registry, registry.current())
+    agent._staged = None
+    if agent._pool is not pool or pool.map(abs, [-1]) != [1]:
+        raise SystemExit("Staging a version stopped the live worker pool")
+
+
+def serve(agent, registry, texts, args, reload_in_request):
+    """
+    Answer requests while versions are published, and return the latency of
+    each request and the number of versions adopted.
+    """
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=publisher,
+        args=(registry, args.model_dir, args.versions, args.interval, stop))
+    thread.start()
+    latencies, adopted = [], 0
+    version = registry.current()
+    deadline = time.monotonic() + args.interval * (args.versions + 1)
+    i = 0
+    while time.monotonic() < deadline:
+        request = texts[i % len(texts):i % len(texts) + args.size]
+        i += args.size
+        adopted_version = agent.model_version
+        start = time.perf_counter()
+        if reload_in_request:
+            # The naive approach: reload the models when the request finds
+            # a new version
+            current = registry.current()
+            if current != version:
+                agent._set_model_dir(registry.version_path(current))
+                agent._load_models(eager=True)
+                version = current
+                adopted += 1
+        predictions = agent.predict(request)
+        agent.declutter(request, predictions)
+        latencies.append(time.perf_counter() - start)
+        if not reload_in_request and agent.model_version != adopted_version:
+            adopted += 1
+    stop.set()
+    thread.join()
+    return latencies, adopted
+
+
+def main():
+    parser = ArgumentParser(description="Measure the request latency of an "
+                                        "agent adopting new model versions "
+                                        "from a registry, reloading in the "
+                                        "request path or staging them in the "
+                                        "background")
+    parser.add_argument("--jsonl-file",
+                        default="datasets/json/declutter_dataset_full.jsonl")
+    parser.add_argument("--model-dir", required=True,
+                        help="Directory holding the Safaa models to publish")
+    parser.add_argument("--limit", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=20,
+                        help="Strings per request")
+    parser.add_argument("--versions", type=int, default=3)
+    parser.add_argument("--interval", type=float, default=3.0,
+                        help="Seconds between published versions")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Worker processes of a ParallelSafaaAgent, "
+                             "0 using a SafaaAgent")
+    args = parser.parse_args()
+
+    texts = read_texts(args.jsonl_file, args.limit)
+    for mode in ("reload in request", "background staging"):
+        directory = tempfile.mkdtemp()
+        try:
+            registry = ModelRegistry(directory)
+            registry.publish(args.model_dir)
+            if args.workers:
+                agent = ParallelSafaaAgent(
+                    workers=args.workers,
+                    chunk_size=max(1, args.size // args.workers),
+                    model_dir=registry.version_path(), deduplicate=False)
+                check_staging_keeps_pool(agent, registry)
+            else:
+                agent = SafaaAgent(model_dir=registry.version_path(),
+                                   deduplicate=False)
+            agent._load_models(eager=True)
+            if mode == "background staging":
+                agent.watch(registry, interval=0.1)
+            latencies, adopted = serve(agent, registry, texts, args,
+                                       mode == "reload in request")
+            agent.stop_watching()
+            if args.workers:
+                agent.close()
+        finally:
+            shutil.rmtree(directory)
+        percentiles = quantiles(latencies, n=100)
+        print(f"{mode}: {len(latencies)} requests, {adopted} versions "
+              f"adopted, p50 {percentiles[49] * 1000:.0f} ms, "
+              f"p99 {percentiles[98] * 1000:.0f} ms, "
+              f"max {max(latencies) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
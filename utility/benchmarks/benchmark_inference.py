@@ -0,0 +1,68 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+import json
+import time
+from argparse import ArgumentParser
+
+from safaa.Safaa import DEFAULT_BATCH_SIZE, SafaaAgent
+
+
+def read_texts(jsonl_path, limit=None):
+    """
+    Read the texts of a JSONL dataset, optionally keeping only the first
+    `limit` lines.
+    """
+    texts = []
+    with open(jsonl_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if limit is not None and len(texts) >= limit:
+                break
+            texts.append(json.loads(line)['text'])
+    return texts
+
+
+def time_docs_per_second(function, texts):
+    """
+    Run the function over the texts and return the achieved docs/sec.
+    """
+    start = time.perf_counter()
+    function(texts)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def main():
+    parser = ArgumentParser(description="Compare per-call spaCy inference "
+                                        "with batched nlp.pipe inference")
+    parser.add_argument("--jsonl-file",
+                        default="datasets/json/declutter_dataset_full.jsonl",
+                        help="Path to the JSONL dataset to read texts from")
+    parser.add_argument("--model-dir", default=None,
+                        help="Directory holding the Safaa models")
+    parser.add_argument("--limit", type=int, default=None,
+                        help="Only use the first LIMIT texts")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--n-process", type=int, default=1)
+    args = parser.parse_args()
+
+    texts = read_texts(args.jsonl_file, args.limit)
+    agent = SafaaAgent(model_dir=args.model_dir, batch_size=args.batch_size,
+                       n_process=args.n_process)
+    print(f"{len(texts)} texts, batch size {args.batch_size}, "
+          f"{args.n_process} process(es)")
+
+    # Per-call inference, as done before nlp.pipe was used
+    for name, model in (("entity_recognizer", agent.entity_recognizer),
+                        ("declutter_model", agent.declutter_model)):
+        before = time_docs_per_second(
+            lambda data: [model(sentence) for sentence in data], texts)
+        after = time_docs_per_second(
+            lambda data: agent._pipe(model, data, lambda doc: doc, list),
+            texts)
+        print(f"{name}: {before:.1f} docs/sec per call, "
+              f"{after:.1f} docs/sec batched ({after / before:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+import json
+import random
+import time
+from argparse import ArgumentParser
+from statistics import quantiles
+
+from safaa.Safaa import SafaaAgent
+
+MODES = {
+    "unsorted, whole strings": {"sort_by_length": False},
+    "sorted by length": {},
+    "sorted, windows": {"overflow": "window"},
+    "sorted, truncated": {"overflow": "truncate"},
+}
+
+
+def build_requests(jsonl_path, args):
+    """
+    Sample requests of dataset strings, replacing a share of the strings with
+    long paragraphs joined from other strings, like license texts reported
+    as copyright notices.
+    """
+    with open(jsonl_path, 'r', encoding='utf-8') as f:
+        texts = [json.loads(line)['text'] for line in f]
+    rng = random.Random(args.seed)
+    requests = []
+    for _ in range(args.requests):
+        request = rng.sample(texts, args.request_size)
+        for i in range(len(request)):
+            if rng.random() < args.long_share:
+                paragraph = []
+                while sum(map(len, paragraph)) < args.long_chars:
+                    paragraph.append(rng.choice(texts))
+                request[i] = " ".join(paragraph)[:args.long_chars]
+        requests.append(request)
+    return requests
+
+
+def main():
+    parser = ArgumentParser(description="Compare the latency distribution "
+                                        "of predict and declutter requests "
+                                        "mixing short and very long strings, "
+                                        "with and without length bucketing "
+                                        "and a character budget")
+    parser.add_argument("--jsonl-file",
+                        default="datasets/json/declutter_dataset_full.jsonl")
+    parser.add_argument("--model-dir", default=None,
+                        help="Directory holding the Safaa models")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--request-size", type=int, default=50)
+    parser.add_argument("--long-share", type=float, default=0.01,
+                        help="Share of strings replaced by long paragraphs")
+    parser.add_argument("--long-chars", type=int, default=20000)
+    parser.add_argument("--max-chars", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    requests = build_requests(args.jsonl_file, args)
+    baseline = None
+    for mode, options in MODES.items():
+        if "overflow" in options:
+            options = dict(options, max_chars=args.max_chars)
+        agent = SafaaAgent(model_dir=args.model_dir, **options)
+        agent._load_models(eager=True)
+        latencies, results = [], []
+        for request in requests:
+            start = time.perf_counter()
+            predictions = agent.predict(request)
+            decluttered = agent.declutter(request, predictions)
+            latencies.append(time.perf_counter() - start)
+            results.append((predictions, decluttered))
+
+        if baseline is None:
+            baseline = results
+        changed = sum(
+            int(a != b)
+            for result, expected in zip(results, baseline)
+            for a, b in zip(zip(*result), zip(*expected))
+        )
+        percentiles = quantiles(latencies, n=100)
+        print(f"{mode}: p50 {percentiles[49] * 1000:.0f} ms, "
+              f"p90 {percentiles[89] * 1000:.0f} ms, "
+              f"p99 {percentiles[98] * 1000:.0f} ms, "
+              f"max {max(latencies) * 1000:.0f} ms, "
+              f"total {sum(latencies):.1f} s, "
+              f"{changed} results differ from the first mode")
+
+
+if __name__ == "__main__":
+    main()
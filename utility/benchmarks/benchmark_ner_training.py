@@ -0,0 +1,86 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+import spacy
+from spacy.training import Corpus
+
+from safaa.Safaa import CONFIGS_DIR, SafaaAgent
+
+
+def evaluate(model_path, dev_path):
+    """
+    Return the entity F-score of a trained pipeline on the development set.
+    """
+    nlp = spacy.load(model_path)
+    return nlp.evaluate(Corpus(dev_path)(nlp))["ents_f"]
+
+
+def main():
+    parser = ArgumentParser(description="Compare the wall-clock time of "
+                                        "training the NER pipeline in a "
+                                        "'spacy train' subprocess, in-process "
+                                        "and in-process from the loaded "
+                                        "pipeline")
+    parser.add_argument("train_path", help=".spacy training data")
+    parser.add_argument("dev_path", help=".spacy development data")
+    parser.add_argument("--model-dir", default=None,
+                        help="Directory holding the Safaa models")
+    parser.add_argument("--declutter-model", action="store_true",
+                        help="Train the declutter model instead of the "
+                             "entity recognizer")
+    parser.add_argument("--max-steps", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+
+    overrides = {"training.max_steps": args.max_steps,
+                 "training.eval_frequency": max(args.max_steps // 4, 1)}
+    directory = tempfile.mkdtemp()
+    try:
+        # The previous approach: a fresh interpreter running spacy train
+        output_path = os.path.join(directory, "subprocess")
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-m", "spacy", "train",
+             os.path.join(CONFIGS_DIR, "train.cfg"),
+             "--output", output_path,
+             "--paths.train", args.train_path,
+             "--paths.dev", args.dev_path]
+            + [f"--{name}={value}" for name, value in overrides.items()],
+            check=True, capture_output=True)
+        seconds = time.perf_counter() - start
+        score = evaluate(os.path.join(output_path, "model-best"),
+                         args.dev_path)
+        print(f"subprocess: {seconds:.1f} s, ents_f {score:.3f}")
+
+        agent = SafaaAgent(model_dir=args.model_dir)
+        name = "declutter_model" if args.declutter_model else \
+            "entity_recognizer"
+        getattr(agent, name)
+        for mode, warm_start in (("in-process", False),
+                                 ("warm start", True)):
+            output_path = os.path.join(directory, mode.replace(" ", "-"))
+            start = time.perf_counter()
+            agent.train_ner_model(args.train_path, args.dev_path,
+                                  declutter_model=args.declutter_model,
+                                  warm_start=warm_start,
+                                  n_threads=args.threads,
+                                  output_path=output_path,
+                                  overrides=overrides)
+            seconds = time.perf_counter() - start
+            score = evaluate(output_path, args.dev_path)
+            print(f"{mode}: {seconds:.1f} s, ents_f {score:.3f}")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+import csv
+import json
+import re
+import time
+from argparse import ArgumentParser
+
+from safaa.normalizer import TextNormalizer
+
+# The substitutions as they were applied before TextNormalizer existed
+LEGACY_SUBSTITUTIONS = [
+    (r"\d{4}", " DATE "),
+    (r"\d+", " "),
+    (r"©", " COPYRIGHTSYMBOL "),
+    (r"\(c\)", " COPYRIGHTSYMBOL "),
+    (r"\(C\)", " COPYRIGHTSYMBOL "),
+    (
+        r"""(?:[a-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[a-z0-9!#$%&'*+/=?^_`{|}~-]+)*|"
+                (?:[\x01-\x08\x0b\x0c\x0e-\x1f\x21\x23-\x5b\x5d-\x7f]|
+                \\[\x01-\x09\x0b\x0c\x0e-\x7f])*")@
+                (?:(?:[a-z0-9](?:[a-z0-9-]*[a-z0-9])?\.)+[a-z0-9]
+                (?:[a-z0-9-]*[a-z0-9])?|\[(?:(?:(2(5[0-5]|[0-4][0-9])|
+                1[0-9][0-9]|[1-9]?[0-9]))\.){3}(?:(2(5[0-5]|[0-4][0-9])|
+                1[0-9][0-9]|[1-9]?[0-9])|[a-z0-9-]*[a-z0-9]:(
+                [\x01-\x08\x0b\x0c\x0e-\x1f\x21-\x5a\x53-\x7f]|
+                \\[\x01-\x09\x0b\x0c\x0e-\x7f])+)])""",
+        " EMAIL ",
+    ),
+    (r"[^a-zA-Z0-9]", " "),
+]
+
+
+def legacy_substitutions(data):
+    """
+    Apply the substitutions one pattern at a time over the whole dataset.
+    """
+    for pattern, replacement in LEGACY_SUBSTITUTIONS:
+        data = [re.sub(pattern, replacement, sentence) for sentence in data]
+    return [sentence.lower().strip() for sentence in data]
+
+
+def read_dataset_texts(jsonl_paths, csv_paths):
+    """
+    Read the texts of the bundled JSONL and CSV datasets.
+    """
+    texts = []
+    for path in jsonl_paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            texts.extend(json.loads(line)['text'] for line in f)
+    for path in csv_paths:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            texts.extend(row['copyright'] for row in csv.DictReader(f))
+    return texts
+
+
+def best_time(function, data, repeat):
+    """
+    Return the best wall time of `repeat` runs of the function.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(data)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = ArgumentParser(description="Compare the legacy text "
+                                        "substitutions with TextNormalizer")
+    parser.add_argument("--jsonl-file", action="append",
+                        help="JSONL dataset to read texts from, can be "
+                             "repeated")
+    parser.add_argument("--csv-file", action="append",
+                        help="CSV dataset with a copyright column, can be "
+                             "repeated")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    jsonl_paths = args.jsonl_file or [
+        "datasets/json/declutter_dataset.jsonl",
+        "datasets/json/declutter_dataset_full.jsonl",
+    ]
+    csv_paths = args.csv_file or ["datasets/false_positive_detection_dataset.csv"]
+    texts = read_dataset_texts(jsonl_paths, csv_paths)
+
+    normalizer = TextNormalizer()
+    expected = legacy_substitutions(texts)
+    actual = list(normalizer.normalize_all(texts))
+    mismatches = sum(a != b for a, b in zip(expected, actual))
+    print(f"{len(texts)} texts, {mismatches} mismatching outputs")
+
+    before = best_time(legacy_substitutions, texts, args.repeat)
+    after = best_time(lambda data: list(normalizer.normalize_all(data)),
+                      texts, args.repeat)
+    print(f"legacy: {len(texts) / before:.0f} texts/sec")
+    print(f"TextNormalizer: {len(texts) / after:.0f} texts/sec "
+          f"({before / after:.2f}x)")
+
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
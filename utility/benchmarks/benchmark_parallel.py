@@ -0,0 +1,67 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+import json
+import time
+from argparse import ArgumentParser
+
+from safaa.parallel import DEFAULT_CHUNK_SIZE, ParallelSafaaAgent
+
+
+def read_texts(jsonl_path, limit=None):
+    """
+    Read the texts of a JSONL dataset, optionally keeping only the first
+    `limit` lines.
+    """
+    texts = []
+    with open(jsonl_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if limit is not None and len(texts) >= limit:
+                break
+            texts.append(json.loads(line)['text'])
+    return texts
+
+
+def main():
+    parser = ArgumentParser(description="Measure how predict and declutter "
+                                        "scale with the number of worker "
+                                        "processes")
+    parser.add_argument("--jsonl-file",
+                        default="datasets/json/declutter_dataset_full.jsonl",
+                        help="Path to the JSONL dataset to read texts from")
+    parser.add_argument("--model-dir", default=None,
+                        help="Directory holding the Safaa models")
+    parser.add_argument("--limit", type=int, default=None,
+                        help="Only use the first LIMIT texts")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=[1, 2, 4, 8])
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    texts = read_texts(args.jsonl_file, args.limit)
+    expected = None
+    baseline = None
+    for workers in args.workers:
+        # Deduplication is disabled so every text reaches the workers
+        with ParallelSafaaAgent(workers=workers, chunk_size=args.chunk_size,
+                                model_dir=args.model_dir,
+                                deduplicate=False) as agent:
+            # Start the pool before timing
+            agent._get_pool()
+            start = time.perf_counter()
+            predictions = agent.predict(texts)
+            decluttered = agent.declutter(texts, predictions)
+            elapsed = time.perf_counter() - start
+
+        if expected is None:
+            expected = (predictions, decluttered)
+            baseline = elapsed
+        elif (predictions, decluttered) != expected:
+            raise SystemExit(f"{workers} workers changed the results")
+        print(f"{workers} worker(s): {len(texts) / elapsed:.1f} docs/sec, "
+              f"speedup {baseline / elapsed:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+import csv
+import time
+from argparse import ArgumentParser
+
+from safaa.prefilter import RULE_SETS, Prefilter
+from safaa.Safaa import SafaaAgent
+
+
+def read_dataset(csv_path, limit=None):
+    """
+    Read the copyright strings of the false positive detection dataset and
+    whether each is a false positive.
+    """
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        rows = list(csv.DictReader(f))[:limit]
+    return ([row['copyright'] for row in rows],
+            [row['falsePositive'] == '1' for row in rows])
+
+
+def accuracy(predictions, labels):
+    """
+    Return the share of predictions agreeing with the labels.
+    """
+    return sum((p == "f") == label
+               for p, label in zip(predictions, labels)) / len(labels)
+
+
+def main():
+    parser = ArgumentParser(description="Report the accuracy and throughput "
+                                        "of predict without a prefilter and "
+                                        "with each prefilter rule set")
+    parser.add_argument("--csv-file",
+                        default="datasets/false_positive_detection_dataset.csv")
+    parser.add_argument("--model-dir", default=None,
+                        help="Directory holding the Safaa models")
+    parser.add_argument("--limit", type=int, default=None,
+                        help="Only use the first LIMIT strings")
+    args = parser.parse_args()
+
+    texts, labels = read_dataset(args.csv_file, args.limit)
+    baseline = None
+    for rules in (None, *RULE_SETS):
+        prefilter = Prefilter(rules) if rules else None
+        # Deduplication is disabled so every string is timed
+        agent = SafaaAgent(model_dir=args.model_dir, deduplicate=False,
+                           prefilter=prefilter)
+        agent._load_models(eager=True)
+        start = time.perf_counter()
+        predictions = agent.predict(texts)
+        elapsed = time.perf_counter() - start
+
+        line = (f"{rules or 'no prefilter'}: "
+                f"accuracy {accuracy(predictions, labels):.4f}, "
+                f"{len(texts) / elapsed:.0f} strings/sec")
+        if baseline is None:
+            baseline = predictions
+        else:
+            prefiltered = [i for i, label in
+                           enumerate(prefilter.label_all(texts))
+                           if label is not None]
+            rule_accuracy = accuracy([predictions[i] for i in prefiltered],
+                                     [labels[i] for i in prefiltered])
+            model_accuracy = accuracy([baseline[i] for i in prefiltered],
+                                      [labels[i] for i in prefiltered])
+            line += (f", {len(prefiltered) / len(texts):.1%} prefiltered "
+                     f"with accuracy {rule_accuracy:.4f} "
+                     f"(models {model_accuracy:.4f} on the same strings)")
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+import json
+import time
+from argparse import ArgumentParser
+
+from safaa.Safaa import SafaaAgent
+
+
+def read_texts(jsonl_path, limit=None):
+    """
+    Read the texts of a JSONL dataset, optionally keeping only the first
+    `limit` lines.
+    """
+    texts = []
+    with open(jsonl_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if limit is not None and len(texts) >= limit:
+                break
+            texts.append(json.loads(line)['text'])
+    return texts
+
+
+def two_calls(agent, texts):
+    predictions = agent.predict(texts)
+    return list(zip(predictions, agent.declutter(texts, predictions)))
+
+
+def fused(agent, texts):
+    return agent.process(texts)
+
+
+def main():
+    parser = ArgumentParser(description="Compare predict followed by "
+                                        "declutter with the fused process "
+                                        "call")
+    parser.add_argument("--jsonl-file",
+                        default="datasets/json/declutter_dataset_full.jsonl",
+                        help="Path to the JSONL dataset to read texts from")
+    parser.add_argument("--model-dir", default=None,
+                        help="Directory holding the Safaa models")
+    parser.add_argument("--limit", type=int, default=None,
+                        help="Only use the first LIMIT texts")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    texts = read_texts(args.jsonl_file, args.limit)
+    agent = SafaaAgent(model_dir=args.model_dir)
+    agent._load_models(eager=True)
+
+    results = {}
+    for function in (two_calls, fused):
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            results[function.__name__] = function(agent, texts)
+            timings.append(time.perf_counter() - start)
+        print(f"{function.__name__}: {len(texts) / min(timings):.1f} docs/sec")
+
+    if results["two_calls"] != results["fused"]:
+        raise SystemExit("process() and predict() + declutter() differ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+import csv
+import time
+from argparse import ArgumentParser
+from statistics import median
+
+from safaa.normalizer import TextNormalizer
+from safaa.Safaa import SafaaAgent
+from safaa.scorer import LinearScorer
+
+
+def read_texts(csv_path, limit):
+    """
+    Read and normalize up to `limit` copyright strings of the false positive
+    detection dataset.
+    """
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        texts = [row['copyright'] for row in csv.DictReader(f)]
+    return list(TextNormalizer().normalize_all(texts[:limit]))
+
+
+def latency(function, texts, repeat):
+    """
+    Return the median wall time of `repeat` calls.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(texts)
+        timings.append(time.perf_counter() - start)
+    return median(timings)
+
+
+def main():
+    parser = ArgumentParser(description="Compare the latency of the "
+                                        "scikit-learn and the LinearScorer "
+                                        "classification of preprocessed "
+                                        "strings")
+    parser.add_argument("--csv-file",
+                        default="datasets/false_positive_detection_dataset.csv")
+    parser.add_argument("--model-dir", default=None,
+                        help="Directory holding the Safaa models")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[1, 10, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    agent = SafaaAgent(model_dir=args.model_dir, compact=False)
+    vectorizer = agent.vectorizer
+    detector = agent.false_positive_detector
+    scorer = LinearScorer.from_models(vectorizer, detector)
+    if scorer is None:
+        raise SystemExit("The models are not supported by LinearScorer")
+
+    def sklearn_predict(texts):
+        return detector.predict(vectorizer.transform(texts))
+
+    texts = read_texts(args.csv_file, max(args.sizes))
+    mismatches = sum(
+        int(a != b)
+        for a, b in zip(sklearn_predict(texts), scorer.predict(texts))
+    )
+    print(f"{mismatches} of {len(texts)} labels differ")
+
+    for size in args.sizes:
+        sample = texts[:size]
+        baseline = latency(sklearn_predict, sample, args.repeat)
+        fast = latency(scorer.predict, sample, args.repeat)
+        print(f"{size} inputs: scikit-learn {baseline * 1000:.3f} ms, "
+              f"LinearScorer {fast * 1000:.3f} ms, "
+              f"speedup {baseline / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
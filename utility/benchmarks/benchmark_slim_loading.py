@@ -0,0 +1,93 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+import json
+import subprocess
+import sys
+from argparse import ArgumentParser
+from statistics import median
+
+# Measures one fresh interpreter loading both spaCy pipelines, then running
+# them over the texts
+LOAD_SCRIPT = """
+import json, sys, time
+
+def rss():
+    # Resident memory in bytes, from smaps_rollup on Linux
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Rss:"):
+                return int(line.split()[1]) * 1024
+
+from safaa.Safaa import SafaaAgent
+import spacy
+model_dir, jsonl_path, limit, inference_only, share_vocab = sys.argv[1:]
+with open(jsonl_path, "r", encoding="utf-8") as f:
+    texts = [json.loads(line)["text"] for _, line in zip(range(int(limit)), f)]
+agent = SafaaAgent(model_dir=model_dir or None, deduplicate=False,
+                   inference_only=inference_only == "1",
+                   share_vocab=share_vocab == "1")
+before = rss()
+start = time.perf_counter()
+agent.entity_recognizer
+agent.declutter_model
+loaded = time.perf_counter()
+loaded_rss = rss()
+agent.preprocess_data(texts)
+agent._declutter(texts)
+processed = time.perf_counter()
+print(json.dumps({
+    "load": loaded - start,
+    "per_doc": (processed - loaded) / (2 * len(texts)),
+    "rss": loaded_rss - before,
+    "peak_rss": rss() - before,
+}))
+"""
+
+MODES = {
+    "default": ("0", "0"),
+    "inference only": ("1", "0"),
+    "inference only, shared vocab": ("1", "1"),
+}
+
+
+def measure(args, inference_only, share_vocab):
+    """
+    Run the load script in `runs` fresh interpreters and return the median
+    of each measurement.
+    """
+    results = []
+    for _ in range(args.runs):
+        output = subprocess.run(
+            [sys.executable, "-c", LOAD_SCRIPT, args.model_dir or "",
+             args.jsonl_file, str(args.limit), inference_only, share_vocab],
+            check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.splitlines()[-1]))
+    return {key: median(result[key] for result in results)
+            for key in results[0]}
+
+
+def main():
+    parser = ArgumentParser(description="Compare the load time, memory and "
+                                        "per-doc latency of the spaCy "
+                                        "pipelines loaded in full and for "
+                                        "inference only")
+    parser.add_argument("--jsonl-file",
+                        default="datasets/json/declutter_dataset_full.jsonl")
+    parser.add_argument("--model-dir", default=None,
+                        help="Directory holding the Safaa models")
+    parser.add_argument("--limit", type=int, default=2000)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    for mode, options in MODES.items():
+        result = measure(args, *options)
+        print(f"{mode}: load {result['load'] * 1000:.0f} ms, "
+              f"RSS +{result['rss'] / 2 ** 20:.1f} MB after loading, "
+              f"+{result['peak_rss'] / 2 ** 20:.1f} MB after processing, "
+              f"{result['per_doc'] * 1000:.3f} ms per doc")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+import json
+import subprocess
+import sys
+from argparse import ArgumentParser
+from statistics import median
+
+# Measures one fresh interpreter: import, construction and first prediction
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from safaa.Safaa import SafaaAgent
+imported = time.perf_counter()
+agent = SafaaAgent(model_dir=sys.argv[1] or None)
+if sys.argv[2] == "eager":
+    agent._load_models(eager=True)
+constructed = time.perf_counter()
+agent.predict(["Copyright (C) 2010 Free Software Foundation, Inc."])
+predicted = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "construct": constructed - imported,
+    "first_prediction": predicted - start,
+}))
+"""
+
+
+def measure(model_dir, mode, runs):
+    """
+    Run the startup script in `runs` fresh interpreters and return the
+    median of each timing.
+    """
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT, model_dir or "", mode],
+            check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.splitlines()[-1]))
+    return {key: median(result[key] for result in results)
+            for key in results[0]}
+
+
+def main():
+    parser = ArgumentParser(description="Measure the import time and time "
+                                        "to first prediction of a fresh "
+                                        "process")
+    parser.add_argument("--model-dir", default=None,
+                        help="Directory holding the Safaa models")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    for mode in ("eager", "lazy"):
+        timings = measure(args.model_dir, mode, args.runs)
+        print(f"{mode}: import {timings['import'] * 1000:.0f} ms, "
+              f"construct {timings['construct'] * 1000:.0f} ms, "
+              f"first prediction {timings['first_prediction'] * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+import os
+import resource
+import time
+from argparse import ArgumentParser
+
+from safaa.Safaa import DEFAULT_CHUNK_SIZE, SafaaAgent
+
+
+def synthetic_lines(count):
+    """
+    Lazily generate `count` distinct copyright-like lines.
+    """
+    for i in range(count):
+        if i % 3:
+            yield f"Copyright (C) {1990 + i % 30} Holder {i} Inc. <dev{i}@example.org>"
+        else:
+            yield f"free text line {i} that is not a copyright notice"
+
+
+def current_rss_mb():
+    """
+    Return the resident set size of this process, in MB.
+    """
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def peak_rss_mb():
+    """
+    Return the peak resident set size of this process, in MB.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = ArgumentParser(description="Check that classify_and_declutter_"
+                                        "iter keeps a flat memory profile "
+                                        "over a large synthetic input")
+    parser.add_argument("--model-dir", default=None,
+                        help="Directory holding the Safaa models")
+    parser.add_argument("--lines", type=int, default=1000000)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--tolerance-mb", type=float, default=50,
+                        help="Allowed RSS growth after the first tenth of "
+                             "the input")
+    args = parser.parse_args()
+
+    agent = SafaaAgent(model_dir=args.model_dir)
+    checkpoint = max(args.lines // 10, 1)
+    reference = None
+    start = time.perf_counter()
+    results = agent.classify_and_declutter_iter(
+        synthetic_lines(args.lines), chunk_size=args.chunk_size)
+    for count, _ in enumerate(results, 1):
+        if count % checkpoint:
+            continue
+        rss = current_rss_mb()
+        # Measure the growth from the first checkpoint, once every model is
+        # loaded and warm
+        reference = reference or rss
+        print(f"{count} lines: RSS {rss:.1f} MB, peak {peak_rss_mb():.1f} MB, "
+              f"{count / (time.perf_counter() - start):.0f} lines/sec")
+
+    growth = current_rss_mb() - (reference or current_rss_mb())
+    print(f"RSS growth after the first tenth: {growth:.1f} MB")
+    if growth > args.tolerance_mb:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+import csv
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from statistics import median
+
+from safaa.Safaa import SafaaAgent
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "NER"))
+from data_conversion import convert_jsonl_to_spacy  # noqa: E402
+
+
+def read_jsonl_lines(jsonl_path, limit):
+    """
+    Read the first `limit` lines of a JSONL dataset, cycling through it if
+    it is shorter.
+    """
+    with open(jsonl_path, 'r', encoding='utf-8') as f:
+        lines = [line for line in f if line.strip()]
+    return [lines[i % len(lines)] for i in range(limit)]
+
+
+def read_training_data(csv_path, limit):
+    """
+    Read the first `limit` texts and labels of the false positive detection
+    dataset.
+    """
+    texts, labels = [], []
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            if len(texts) >= limit:
+                break
+            texts.append(row['copyright'])
+            labels.append(int(row['falsePositive']))
+    return texts, labels
+
+
+def build_cases(args):
+    """
+    Return the benchmark cases as (name, size, setup, run) tuples. setup
+    returns the argument passed to run, and is not timed.
+    """
+    def new_agent():
+        return SafaaAgent(model_dir=args.model_dir, deduplicate=False)
+
+    agent = new_agent()
+    agent._load_models(eager=True)
+    cases = [("construct", 1, lambda: None,
+              lambda _: new_agent()._load_models(eager=True))]
+
+    for size in args.sizes:
+        lines = read_jsonl_lines(args.jsonl_file, size)
+        texts = [json.loads(line)['text'] for line in lines]
+        predictions = agent.predict(texts)
+        training_data = read_training_data(args.csv_file, size)
+
+        def write_jsonl(lines=lines):
+            directory = tempfile.mkdtemp()
+            path = os.path.join(directory, "data.jsonl")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.writelines(lines)
+            return path
+
+        def training_agent():
+            trained = new_agent()
+            trained.false_positive_detector
+            trained.vectorizer
+            trained.entity_recognizer
+            return trained
+
+        cases.extend([
+            ("preprocess_data", size, lambda texts=texts: texts,
+             agent.preprocess_data),
+            ("predict", size, lambda texts=texts: texts, agent.predict),
+            ("declutter", size, lambda texts=texts: texts,
+             lambda texts, predictions=predictions: agent.declutter(
+                 texts, predictions)),
+            ("train_false_positive_detector_model", size, training_agent,
+             lambda trained, data=training_data:
+             trained.train_false_positive_detector_model(*data)),
+            ("convert_jsonl_to_spacy", size, write_jsonl,
+             lambda path: convert_jsonl_to_spacy(
+                 path, path.replace(".jsonl", ".spacy"))),
+        ])
+    return cases
+
+
+def measure(setup, run, repeat):
+    """
+    Return the median wall time of `repeat` runs and the peak memory
+    allocated by one extra run.
+    """
+    timings = []
+    for _ in range(repeat):
+        argument = setup()
+        start = time.perf_counter()
+        run(argument)
+        timings.append(time.perf_counter() - start)
+
+    argument = setup()
+    tracemalloc.start()
+    run(argument)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return median(timings), peak_memory
+
+
+def versions():
+    """
+    Return the versions of the dependencies pinned in setup.py.
+    """
+    import joblib
+    import sklearn
+    import spacy
+    return {"python": platform.python_version(), "spacy": spacy.__version__,
+            "scikit-learn": sklearn.__version__,
+            "joblib": joblib.__version__}
+
+
+def main():
+    parser = ArgumentParser(description="Run the Safaa benchmark suite, "
+                                        "append the results to a JSON "
+                                        "history file and fail on "
+                                        "regressions")
+    parser.add_argument("--jsonl-file",
+                        default="datasets/json/declutter_dataset_full.jsonl",
+                        help="JSONL dataset the inputs are drawn from")
+    parser.add_argument("--csv-file",
+                        default="datasets/false_positive_detection_dataset.csv",
+                        help="CSV dataset the training inputs are drawn from")
+    parser.add_argument("--model-dir", default=None,
+                        help="Directory holding the Safaa models")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--history", default="benchmark_history.json",
+                        help="JSON file the results are appended to")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Fail when a latency grows by more than this "
+                             "fraction over the median of the earlier "
+                             "passing runs")
+    args = parser.parse_args()
+
+    results = {}
+    for name, size, setup, run in build_cases(args):
+        latency, peak_memory = measure(setup, run, args.repeat)
+        results[f"{name}[{size}]"] = {
+            "latency": latency,
+            "throughput": size / latency,
+            "peak_memory": peak_memory,
+        }
+        print(f"{name}[{size}]: {latency * 1000:.1f} ms, "
+              f"{size / latency:.1f} items/sec, "
+              f"peak memory {peak_memory / 2 ** 20:.1f} MB")
+
+    history = []
+    if os.path.exists(args.history):
+        with open(args.history, 'r', encoding='utf-8') as f:
+            history = json.load(f)
+
+    # Compare with the median of the earlier passing runs, so that neither a
+    # recorded regression nor a slow drift becomes the new baseline
+    baseline = {}
+    for entry in history:
+        if entry.get("passed", True):
+            for case, result in entry["results"].items():
+                baseline.setdefault(case, []).append(result["latency"])
+    regressions = []
+    for case, result in results.items():
+        if case not in baseline:
+            continue
+        ratio = result["latency"] / median(baseline[case])
+        if ratio > 1 + args.threshold:
+            regressions.append(f"{case}: {ratio:.2f}x slower")
+
+    history.append({
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "versions": versions(),
+        "results": results,
+        "passed": not regressions,
+    })
+    with open(args.history, 'w', encoding='utf-8') as f:
+        json.dump(history, f, indent=2)
+
+    if regressions:
+        print("Regressions over the earlier passing runs:")
+        for regression in regressions:
+            print(f"  {regression}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# SPDX-FileCopyrightText: © Fossology contributors
+#
+# SPDX-License-Identifier: LGPL-2.1-only
+
+import csv
+import json
+import threading
+import time
+from argparse import ArgumentParser
+
+from safaa.Safaa import SafaaAgent
+
+
+def read_texts(jsonl_path, limit):
+    """
+    Read the texts of the first `limit` lines of a JSONL dataset.
+    """
+    texts = []
+    with open(jsonl_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if len(texts) >= limit:
+                break
+            texts.append(json.loads(line)['text'])
+    return texts
+
+
+def read_training_batches(csv_path, size):
+    """
+    Read the labelled strings of a CSV dataset in batches of `size`.
+    """
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        rows = [(row['copyright'], int(row['falsePositive']))
+                for row in csv.DictReader(f)]
+    return [rows[start:start + size] for start in range(0, len(rows), size)]
+
+
+def answer(agent, sample):
+    """
+    Predict, declutter every string and process a sample.
+    """
+    return (agent.predict(sample),
+            agent.declutter(sample, ['t'] * len(sample)),
+            agent.process(sample))
+
+
+def client(agent, samples, reference, check_predictions, counters, lock):
+    """
+    Answer the samples, counting the strings and the wrong results. While
+    the detector trains, only the decluttered strings and the agreement of
+    predict and process within a call can be compared to the reference.
+    """
+    strings = errors = 0
+    for i, sample in samples:
+        try:
+            predictions, decluttered, processed = answer(agent, sample)
+            expected_predictions, expected_decluttered, _ = reference[i]
+            wrong = decluttered != expected_decluttered or any(
+                text != ('' if prediction == 'f' else expected_decluttered[j])
+                for j, (prediction, text) in enumerate(processed))
+            if check_predictions:
+                wrong = (wrong or predictions != expected_predictions
+                         or processed != reference[i][2])
+        except Exception as error:
+            print(f"{type(error).__name__}: {error}")
+            wrong = True
+        strings += len(sample)
+        errors += wrong
+    with lock:
+        counters['strings'] += strings
+        counters['errors'] += errors
+
+
+def trainer(agent, batches, stop, counters):
+    """
+    Train the detector on one batch after the other until stopped.
+    """
+    for batch in batches:
+        if stop.is_set():
+            break
+        texts, labels = zip(*batch)
+        agent.train_false_positive_detector_model(list(texts), list(labels))
+        counters['trained'] += 1
+
+
+def stress(agent, samples, reference, threads, batches=None):
+    """
+    Answer the samples from `threads` threads sharing the agent, training it
+    meanwhile if batches are given, and report the throughput and the number
+    of wrong results.
+    """
+    counters = {'strings': 0, 'errors': 0, 'trained': 0}
+    lock = threading.Lock()
+    shares = [list(enumerate(samples))[i::threads] for i in range(threads)]
+    clients = [threading.Thread(target=client,
+                                args=(agent, share, reference,
+                                      batches is None, counters, lock))
+               for share in shares]
+    stop = threading.Event()
+    training = threading.Thread(target=trainer,
+                                args=(agent, batches or [], stop, counters))
+    start = time.perf_counter()
+    training.start()
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    training.join()
+    return {
+        'strings_per_second': counters['strings'] / elapsed,
+        'errors': counters['errors'],
+        'trained': counters['trained'],
+    }
+
+
+def main():
+    parser = ArgumentParser(description="Stress a SafaaAgent shared by "
+                                        "several threads with concurrent "
+                                        "predict, declutter, process and "
+                                        "training calls, checking the "
+                                        "results against single-threaded "
+                                        "ones")
+    parser.add_argument("--jsonl-file",
+                        default="datasets/json/declutter_dataset_full.jsonl")
+    parser.add_argument("--csv-file",
+                        default="datasets/false_positive_detection_dataset.csv",
+                        help="Labelled strings to train on")
+    parser.add_argument("--model-dir", default=None,
+                        help="Directory holding the Safaa models")
+    parser.add_argument("--limit", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=20,
+                        help="Strings per request")
+    parser.add_argument("--threads", default="1,2,4,8",
+                        help="Comma-separated thread counts")
+    parser.add_argument("--train-batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    texts = read_texts(args.jsonl_file, args.limit)
+    samples = [texts[start:start + args.size]
+               for start in range(0, len(texts), args.size)]
+    agent = SafaaAgent(model_dir=args.model_dir)
+    agent._load_models(eager=True)
+
+    # The results of a single thread are the reference
+    reference = [answer(agent, sample) for sample in samples]
+
+    errors = 0
+    for threads in [int(n) for n in args.threads.split(',')]:
+        result = stress(agent, samples, reference, threads)
+        errors += result['errors']
+        print(f"{threads} threads: "
+              f"{result['strings_per_second']:.0f} strings/sec, "
+              f"{result['errors']} wrong results")
+
+    # Train the detector while the threads keep answering
+    batches = read_training_batches(args.csv_file, args.train_batch_size)
+    threads = max(int(n) for n in args.threads.split(','))
+    result = stress(agent, samples, reference, threads, batches)
+    errors += result['errors']
+    print(f"{threads} threads while training: "
+          f"{result['strings_per_second']:.0f} strings/sec, "
+          f"{result['trained']} training batches, "
+          f"{result['errors']} wrong results")
+
+    # Once trained, the threads agree with a single one again
+    reference = [answer(agent, sample) for sample in samples]
+    result = stress(agent, samples, reference, threads)
+    errors += result['errors']
+    print(f"{threads} threads after training: "
+          f"{result['strings_per_second']:.0f} strings/sec, "
+          f"{result['errors']} wrong results")
+
+    if errors:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()